@@ -0,0 +1,137 @@
+# analysis_history.py - Historique des analyses et agrégats par jour / semaine (pour les tableaux de bord)
+
+# --- Standard Libraries ---
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+# --- Third-Party Libraries ---
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+
+# --- Local Application Imports ---
+import database
+from labels import CLASS_LABELS
+
+# --- Configuration ---
+ANALYSES_COLLECTION = os.getenv("ANALYSES_COLLECTION", "analyses")                  # Une entrée par analyse
+ROLLUPS_COLLECTION = os.getenv("ANALYSIS_ROLLUPS_COLLECTION", "analysis_rollups")   # Agrégats par période
+PERIODS = ("day", "week")
+MAX_TREND_POINTS = 366
+
+# Index créés au démarrage (database.ensure_indexes) : lecture par utilisateur et par date
+INDEXES = {
+    ANALYSES_COLLECTION: [
+        IndexModel([("username", ASCENDING), ("analyzed_at", DESCENDING)], name="username_date"),
+    ],
+    ROLLUPS_COLLECTION: [
+        IndexModel(
+            [("username", ASCENDING), ("model", ASCENDING), ("period", ASCENDING), ("bucket", DESCENDING)],
+            name="username_model_period_bucket", unique=True
+        ),
+    ],
+}
+
+logger = logging.getLogger(__name__)
+
+
+def bucket_start(created_at: str, period: str) -> str:
+    """Début (AAAA-MM-JJ, UTC) du jour ou de la semaine ISO (lundi) contenant la date du tweet."""
+    day = datetime.fromisoformat(created_at).astimezone(timezone.utc).date()
+    if period == "week":
+        day -= timedelta(days=day.weekday())
+    return day.isoformat()
+
+
+# --- Écriture ---
+def rollup_increments(tweets: list[dict]) -> dict:
+    """
+    Regroupe les tweets nouvellement scorés par (période, bucket) et calcule les $inc
+    correspondants : nombre de tweets, compte par label et somme des probabilités.
+    """
+    increments = {}
+    for tweet in tweets:
+        label, probabilities = tweet["prediction"][:2]
+        try:
+            buckets = {period: bucket_start(tweet["created_at"], period) for period in PERIODS}
+        except (TypeError, ValueError): # Date absente ou illisible : hors agrégats
+            continue
+        for period, bucket in buckets.items():
+            inc = increments.setdefault((period, bucket), {"count": 0})
+            inc["count"] += 1
+            inc[f"label_counts.{label}"] = inc.get(f"label_counts.{label}", 0) + 1
+            for name in CLASS_LABELS:
+                key = f"probability_sums.{name}"
+                inc[key] = inc.get(key, 0.0) + probabilities[name]
+    return increments
+
+
+def record_analysis(username: str, tweets_analyzed: int, overall_summary: dict,
+                    new_tweets: list[dict], model_fingerprint: str):
+    """
+    Enregistre le résultat d'une analyse et ajoute aux agrégats les seuls tweets scorés
+    pour la première fois par ce modèle (`new_tweets`) : les agrégats sont maintenus
+    par incréments, jamais recalculés à la lecture.
+    """
+    db = database.get_db()
+    key = username.lower()
+    now = datetime.now(timezone.utc)
+    db[ANALYSES_COLLECTION].insert_one({
+        "username": key,
+        "analyzed_at": now,
+        "tweets_analyzed": tweets_analyzed,
+        "overall_summary": overall_summary,
+        "model": model_fingerprint,
+    })
+
+    operations = [
+        UpdateOne(
+            {"username": key, "model": model_fingerprint, "period": period, "bucket": bucket},
+            {"$inc": inc, "$set": {"updated_at": now}},
+            upsert=True
+        )
+        for (period, bucket), inc in rollup_increments(new_tweets).items()
+    ]
+    if operations:
+        db[ROLLUPS_COLLECTION].bulk_write(operations, ordered=False)
+
+
+# --- Lecture (Motor : appelées directement depuis les routes async, sans thread) ---
+async def latest_summary(username: str) -> dict | None:
+    """Dernière analyse enregistrée pour l'utilisateur, ou None."""
+    return await database.get_async_db()[ANALYSES_COLLECTION].find_one(
+        {"username": username.lower()},
+        {"_id": 0},
+        sort=[("analyzed_at", DESCENDING)]
+    )
+
+
+async def trend(username: str, period: str, limit: int) -> dict:
+    """
+    Série temporelle (du plus ancien au plus récent) des `limit` derniers buckets, pour le
+    modèle de la dernière analyse : répartition des labels et probabilités moyennes.
+    """
+    latest = await latest_summary(username)
+    if latest is None:
+        return {"model": None, "points": []}
+
+    limit = min(limit, MAX_TREND_POINTS)
+    cursor = database.get_async_db()[ROLLUPS_COLLECTION].find(
+        {"username": username.lower(), "model": latest["model"], "period": period},
+        {"_id": 0, "bucket": 1, "count": 1, "label_counts": 1, "probability_sums": 1}
+    ).sort("bucket", DESCENDING).limit(limit)
+
+    points = []
+    for doc in await cursor.to_list(length=limit):
+        count = doc["count"]
+        label_counts = {label: doc.get("label_counts", {}).get(label, 0) for label in CLASS_LABELS}
+        points.append({
+            "bucket": doc["bucket"],
+            "tweets": count,
+            "label_counts": label_counts,
+            "summary": {label: round(n / count * 100, 1) for label, n in label_counts.items()},
+            "mean_probabilities": {
+                label: round(doc["probability_sums"].get(label, 0.0) / count, 2) for label in CLASS_LABELS
+            },
+        })
+    points.reverse()
+    return {"model": latest["model"], "points": points}
@@ -0,0 +1,376 @@
+# backends.py - Backends d'inférence CPU (PyTorch fp32, PyTorch INT8 dynamique, ONNX Runtime)
+
+# --- Standard Libraries ---
+import json
+import logging
+import mmap
+import os
+import struct
+import warnings
+from types import SimpleNamespace
+
+# --- Third-Party Libraries ---
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn.functional as F
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+# --- Local Application Imports ---
+from inference import CLASS_LABELS, NUM_LABELS, MAX_LENGTH
+
+# --- Configuration ---
+BACKENDS = ("pytorch", "int8", "onnx")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "pytorch").lower()
+# Artefact autonome (config + tokenizer + poids safetensors) produit par: python export_model.py --backend artifact
+MODEL_ARTIFACT_DIR = os.getenv("MODEL_ARTIFACT_DIR", "model/bert_mental_health")
+# Poids fp32 mappés en lecture seule depuis model.safetensors : une seule copie par machine,
+# partagée (page cache) par tous les workers uvicorn/gunicorn
+SHARED_WEIGHTS = os.getenv("MODEL_SHARED_WEIGHTS", "0") == "1"
+INT8_MODEL_PATH = os.getenv("INT8_MODEL_PATH", "model/bert_mental_health_model.int8.pt")
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "model/bert_mental_health_model.onnx")
+
+# Porte de validation : un backend optimisé doit rester fidèle au modèle fp32
+GATE_DATA_PATH = os.getenv("BACKEND_GATE_DATA", "data-final.csv")
+GATE_SAMPLE = int(os.getenv("BACKEND_GATE_SAMPLE", "256"))                    # Lignes du CSV utilisées au démarrage
+GATE_MIN_AGREEMENT = float(os.getenv("BACKEND_GATE_MIN_AGREEMENT", "0.99"))    # Accord minimal des labels avec fp32
+GATE_MAX_PROB_DELTA = float(os.getenv("BACKEND_GATE_MAX_PROB_DELTA", "5.0"))   # Écart max de probabilité (points de %)
+
+logger = logging.getLogger(__name__)
+
+
+class BackendValidationError(Exception):
+    """Levée quand un backend optimisé échoue à la porte de validation contre le modèle fp32."""
+
+
+# --- Chargement des modèles ---
+def has_artifact(artifact_dir: str = MODEL_ARTIFACT_DIR) -> bool:
+    return os.path.isfile(os.path.join(artifact_dir, "config.json")) and \
+        os.path.isfile(os.path.join(artifact_dir, "model.safetensors"))
+
+
+def model_weights_path(model_path: str, artifact_dir: str = MODEL_ARTIFACT_DIR) -> str:
+    """Fichier de poids réellement servi (utilisé pour l'empreinte du cache des prédictions)."""
+    if has_artifact(artifact_dir):
+        return os.path.join(artifact_dir, "model.safetensors")
+    return model_path
+
+
+def backend_artifact_path(name: str, model_path: str) -> str:
+    """Fichier de poids réellement chargé par le backend (INT8 et ONNX sont des artefacts distincts du fp32)."""
+    if name == "int8":
+        return INT8_MODEL_PATH
+    if name == "onnx":
+        return ONNX_MODEL_PATH
+    return model_weights_path(model_path)
+
+
+def load_tokenizer(artifact_dir: str = MODEL_ARTIFACT_DIR) -> BertTokenizerFast:
+    """Tokenizer rapide : depuis l'artefact local si présent (aucun accès réseau), sinon depuis le hub."""
+    if has_artifact(artifact_dir):
+        return BertTokenizerFast.from_pretrained(artifact_dir, local_files_only=True)
+    return BertTokenizerFast.from_pretrained("bert-base-uncased")
+
+
+# Types safetensors -> torch (ceux que save_pretrained peut produire)
+_SAFETENSORS_DTYPES = {
+    "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+def mmap_safetensors(path: str) -> dict:
+    """
+    Retourne les tenseurs d'un fichier safetensors comme des vues sur un mmap en lecture
+    seule (aucune copie) : les pages du fichier restent dans le page cache, partagées par
+    tous les processus qui mappent le même fichier.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header_size = struct.unpack("<Q", buffer[:8])[0]
+    header = json.loads(buffer[8:8 + header_size])
+    data_start = 8 + header_size
+
+    tensors = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning) # "buffer non inscriptible" : voulu, les poids sont en lecture seule
+        for name, info in header.items():
+            if name == "__metadata__":
+                continue
+            begin, end = info["data_offsets"]
+            dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+            count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + begin)
+            tensors[name] = tensor.view(info["shape"])
+    return tensors
+
+
+def _materialize_embedding_buffers(model: BertForSequenceClassification, config: BertConfig):
+    """
+    Les buffers non persistants (position_ids, token_type_ids) ne sont pas dans model.safetensors :
+    après l'assignation ils sont encore sur le device meta et sont recréés ici (quelques Ko).
+    """
+    embeddings = model.bert.embeddings
+    position_ids = torch.arange(config.max_position_embeddings).expand((1, -1))
+    defaults = {
+        "position_ids": position_ids,
+        "token_type_ids": torch.zeros(position_ids.size(), dtype=torch.long),
+    }
+    for name, buffer in list(embeddings.named_buffers(recurse=False)):
+        if buffer.is_meta and name in defaults:
+            embeddings.register_buffer(name, defaults[name], persistent=False)
+    leftover = [
+        name for name, tensor in [*model.named_parameters(), *model.named_buffers()] if tensor.is_meta
+    ]
+    if leftover:
+        raise RuntimeError(f"Tenseurs absents de model.safetensors: {', '.join(leftover)}")
+
+
+def load_shared_fp32_model(artifact_dir: str = MODEL_ARTIFACT_DIR) -> BertForSequenceClassification:
+    """
+    Modèle fp32 dont les paramètres pointent directement dans model.safetensors mappé en mémoire.
+    Le squelette est construit sur le device meta (aucune allocation ni initialisation aléatoire) :
+    chaque worker ne garde en propre que ses activations, même pendant le chargement.
+    """
+    config = BertConfig.from_pretrained(artifact_dir, local_files_only=True)
+    with torch.device("meta"):
+        model = BertForSequenceClassification(config)
+    state_dict = mmap_safetensors(os.path.join(artifact_dir, "model.safetensors"))
+    model.load_state_dict(state_dict, strict=True, assign=True)
+    _materialize_embedding_buffers(model, config)
+    model.requires_grad_(False)
+    model.eval()
+    return model
+
+
+def load_fp32_model(model_path: str, device, artifact_dir: str = MODEL_ARTIFACT_DIR,
+                    shared: bool = SHARED_WEIGHTS) -> BertForSequenceClassification:
+    """
+    Modèle de référence fp32.
+    - Avec l'artefact et `shared` (CPU) : paramètres en lecture seule sur le fichier mappé,
+      une seule copie des poids par machine quel que soit le nombre de workers.
+    - Avec l'artefact : poids safetensors mappés en mémoire et chargés en une seule passe
+      (pas d'initialisation aléatoire préalable, pas d'accès au hub).
+    - Sinon (ancien chemin) : bert-base-uncased du hub, puis écrasement par le .bin.
+    """
+    if shared and not has_artifact(artifact_dir):
+        logger.warning(
+            "MODEL_SHARED_WEIGHTS=1 sans artefact safetensors : copie privée des poids dans chaque worker "
+            "(lancez: python export_model.py --backend artifact)", extra={"artifact_dir": artifact_dir}
+        )
+    elif shared and torch.device(device).type != "cpu":
+        logger.warning("MODEL_SHARED_WEIGHTS=1 ignoré hors CPU", extra={"device": str(device)})
+    if has_artifact(artifact_dir) and shared and torch.device(device).type == "cpu":
+        return load_shared_fp32_model(artifact_dir)
+    if has_artifact(artifact_dir):
+        model = BertForSequenceClassification.from_pretrained(
+            artifact_dir,
+            local_files_only=True,
+            low_cpu_mem_usage=True,
+            torch_dtype=torch.float32,
+        )
+    else:
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(model_path)
+        model = BertForSequenceClassification.from_pretrained("bert-base-uncased", num_labels=NUM_LABELS)
+        model.load_state_dict(torch.load(model_path, map_location=device))
+    model.to(device)
+    model.eval()
+    return model
+
+
+def export_artifact(model_path: str, artifact_dir: str = MODEL_ARTIFACT_DIR):
+    """Convertit le .bin en artefact autonome : config.json, fichiers du tokenizer, model.safetensors."""
+    model = BertForSequenceClassification.from_pretrained("bert-base-uncased", num_labels=NUM_LABELS)
+    model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    model.config.id2label = dict(enumerate(CLASS_LABELS))
+    model.config.label2id = {label: i for i, label in enumerate(CLASS_LABELS)}
+    os.makedirs(artifact_dir, exist_ok=True)
+    model.save_pretrained(artifact_dir, safe_serialization=True)
+    BertTokenizerFast.from_pretrained("bert-base-uncased").save_pretrained(artifact_dir)
+    return model
+
+
+def quantize_int8(model: BertForSequenceClassification):
+    """Quantification dynamique INT8 des couches Linear (poids int8, activations fp32)."""
+    return torch.quantization.quantize_dynamic(model.to("cpu"), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_int8_model(int8_path: str):
+    """Recharge l'artefact INT8 produit par export_model.py."""
+    if has_artifact():
+        config = BertConfig.from_pretrained(MODEL_ARTIFACT_DIR, local_files_only=True)
+    else:
+        config = BertConfig.from_pretrained("bert-base-uncased", num_labels=NUM_LABELS)
+    model = BertForSequenceClassification(config) # Squelette : les poids viennent de l'artefact INT8
+    model.eval()
+    model = quantize_int8(model) # Même structure quantifiée que lors de l'export
+    model.load_state_dict(torch.load(int8_path, map_location="cpu"))
+    model.eval()
+    return model
+
+
+class OnnxSequenceClassifier:
+    """
+    Enveloppe une session ONNX Runtime avec la même interface que le modèle PyTorch
+    (`model(**inputs).logits`) pour que le moteur d'inférence reste inchangé.
+    """
+
+    def __init__(self, onnx_path: str, intra_op_threads: int = 0):
+        import onnxruntime as ort # Dépendance optionnelle, seulement pour ce backend
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            # torch.set_num_threads ne limite pas ONNX Runtime : le budget est fixé sur la session
+            options.intra_op_num_threads = intra_op_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+    def __call__(self, **inputs):
+        feed = {
+            name: tensor.cpu().numpy().astype(np.int64)
+            for name, tensor in inputs.items() if name in self.input_names
+        }
+        logits = self.session.run(["logits"], feed)[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+
+def export_onnx(model: BertForSequenceClassification, tokenizer, onnx_path: str, opset: int = 14):
+    """Exporte le modèle fp32 en graphe ONNX avec axes dynamiques (batch, séquence)."""
+    model = model.to("cpu").eval()
+    sample = tokenizer(["exemple de texte"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+        onnx_path,
+        input_names=input_names,
+        output_names=["logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=opset,
+    )
+
+
+def load_backend(name: str, model_path: str, device, threads: int = 0):
+    """
+    Retourne (modèle, device) pour le backend demandé.
+    Les backends INT8 et ONNX s'exécutent toujours sur CPU. `threads` (0 = défaut) borne les
+    threads intra-op de la session ONNX ; pour PyTorch, c'est torch.set_num_threads de l'appelant.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"INFERENCE_BACKEND inconnu: '{name}' (valeurs possibles: {', '.join(BACKENDS)})")
+    if name == "pytorch":
+        return load_fp32_model(model_path, device), device
+
+    cpu = torch.device("cpu")
+    if name == "int8":
+        if not os.path.exists(INT8_MODEL_PATH):
+            raise FileNotFoundError(f"Artefact INT8 introuvable: {INT8_MODEL_PATH} (lancez: python export_model.py --backend int8)")
+        return load_int8_model(INT8_MODEL_PATH), cpu
+
+    if not os.path.exists(ONNX_MODEL_PATH):
+        raise FileNotFoundError(f"Artefact ONNX introuvable: {ONNX_MODEL_PATH} (lancez: python export_model.py --backend onnx)")
+    return OnnxSequenceClassifier(ONNX_MODEL_PATH, intra_op_threads=threads), cpu
+
+
+# --- Porte de validation ---
+def predict_probabilities(model, tokenizer, texts: list[str], device, batch_size: int = 32) -> torch.Tensor:
+    """Probabilités softmax (N x NUM_LABELS) pour une liste de textes."""
+    chunks = []
+    for start in range(0, len(texts), batch_size):
+        inputs = tokenizer(
+            texts[start:start + batch_size],
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=MAX_LENGTH
+        ).to(device)
+        with torch.no_grad():
+            chunks.append(F.softmax(model(**inputs).logits, dim=1).cpu())
+    return torch.cat(chunks)
+
+
+def load_gate_sample(csv_path: str, sample: int, seed: int = 42) -> pd.DataFrame:
+    data = pd.read_csv(csv_path).dropna(subset=["statement"])
+    if sample and sample < len(data):
+        data = data.sample(n=sample, random_state=seed)
+    return data
+
+
+def validate_backend(candidate, candidate_device, reference, reference_device, tokenizer,
+                     csv_path: str = GATE_DATA_PATH, sample: int = GATE_SAMPLE,
+                     min_agreement: float = GATE_MIN_AGREEMENT,
+                     max_prob_delta: float = GATE_MAX_PROB_DELTA) -> dict:
+    """
+    Compare un backend au modèle fp32 sur le CSV labellisé :
+    accord des labels, écart max de probabilité (en points de %) et précision de chacun
+    par rapport à la colonne 'status'.
+    """
+    data = load_gate_sample(csv_path, sample)
+    texts = data["statement"].astype(str).tolist()
+
+    reference_probabilities = predict_probabilities(reference, tokenizer, texts, reference_device)
+    candidate_probabilities = predict_probabilities(candidate, tokenizer, texts, candidate_device)
+
+    reference_labels = reference_probabilities.argmax(dim=1)
+    candidate_labels = candidate_probabilities.argmax(dim=1)
+    agreement = (reference_labels == candidate_labels).float().mean().item()
+    delta = (reference_probabilities - candidate_probabilities).abs().max().item() * 100
+
+    report = {
+        "rows": len(texts),
+        "label_agreement": round(agreement, 4),
+        "max_prob_delta": round(delta, 3),
+        "min_agreement": min_agreement,
+        "max_prob_delta_allowed": max_prob_delta,
+    }
+
+    # Précision contre les labels humains (la casse de 'status' varie dans le CSV)
+    label_index = {label.lower(): i for i, label in enumerate(CLASS_LABELS)}
+    if "status" in data.columns:
+        truth = data["status"].astype(str).str.lower().map(label_index)
+        known = truth.notna().to_numpy()
+        if known.any():
+            truth_tensor = torch.tensor(truth[known].astype(int).to_numpy())
+            known_tensor = torch.from_numpy(known)
+            report["reference_accuracy"] = round((reference_labels[known_tensor] == truth_tensor).float().mean().item(), 4)
+            report["candidate_accuracy"] = round((candidate_labels[known_tensor] == truth_tensor).float().mean().item(), 4)
+
+    report["passed"] = agreement >= min_agreement and delta <= max_prob_delta
+    return report
+
+
+def load_validated_backend(name: str, model_path: str, device, tokenizer):
+    """
+    Charge le backend demandé. Pour INT8/ONNX, exécute la porte de validation contre
+    le modèle fp32 et lève BackendValidationError si elle échoue.
+    """
+    model, backend_device = load_backend(name, model_path, device)
+    if name == "pytorch":
+        return model, backend_device
+
+    logger.info("Validation du backend contre le modèle fp32", extra={
+        "backend": name, "gate_data": GATE_DATA_PATH, "gate_sample": GATE_SAMPLE
+    })
+    reference = load_fp32_model(model_path, torch.device("cpu"))
+    report = validate_backend(model, backend_device, reference, torch.device("cpu"), tokenizer)
+    del reference # Libérer la mémoire du modèle de référence
+    log = logger.info if report["passed"] else logger.error
+    log("Rapport de validation du backend", extra={"backend": name, **report})
+    if not report["passed"]:
+        raise BackendValidationError(
+            f"Le backend '{name}' échoue à la porte de validation "
+            f"(accord {report['label_agreement']} < {GATE_MIN_AGREEMENT} ou écart {report['max_prob_delta']} > {GATE_MAX_PROB_DELTA})."
+        )
+    return model, backend_device
+
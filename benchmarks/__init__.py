@@ -0,0 +1 @@
+# benchmarks - Suite de benchmarks hors ligne du pipeline d'analyse (voir bench_pipeline.py)
@@ -0,0 +1,278 @@
+# benchmarks/bench_pipeline.py - Latence et débit du pipeline d'analyse, entièrement hors ligne
+#
+# Usage (depuis la racine du dépôt):
+#   python -m benchmarks.bench_pipeline                                   # petit BERT aléatoire
+#   python -m benchmarks.bench_pipeline --model real                      # vrai modèle (MODEL_PATH / artefact)
+#   python -m benchmarks.bench_pipeline --save benchmarks/baselines/tiny.json
+#   python -m benchmarks.bench_pipeline --compare benchmarks/baselines/tiny.json --threshold 0.15
+#
+# Mesure : tokenization, forward pass, predict_mental_state et analyze_profile de bout en bout
+# (client Twitter et MongoDB remplacés par des stubs en mémoire), pour plusieurs nombres de
+# tweets, longueurs de texte et niveaux de concurrence. Rapporte p50/p95/p99, débit et pic de RSS.
+# Avec --compare, code de sortie 1 si une régression dépasse le seuil.
+
+# --- Standard Libraries ---
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+# Valeurs factices : main.py refuse de s'importer sans jeton Twitter
+os.environ.setdefault("TWITTER_BEARER_TOKEN", "benchmark-offline")
+
+# --- Third-Party Libraries ---
+import torch
+from starlette.requests import Request
+
+# --- Local Application Imports ---
+import database
+import main
+from benchmarks.stubs import StubTwitterClient, in_memory_database, make_text
+from inference import InferenceEngine
+from prediction_cache import PredictionCache
+from tiny_bert import tiny_model, tiny_tokenizer
+
+TEXT_LENGTHS = [8, 32, 128]          # Mots par texte
+BATCH_SIZES = [1, 8, 32]
+TWEET_COUNTS = [10, 50, 100]
+CONCURRENCY_LEVELS = [1, 4, 16]
+# Requête HTTP minimale : analyze_profile lit ses en-têtes (Accept-Encoding du format compact)
+ANALYZE_HTTP_REQUEST = Request({"type": "http", "method": "POST", "path": "/analyze", "headers": []})
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies_s: list[float], items: int, wall_s: float) -> dict:
+    latencies_ms = [latency * 1000 for latency in latencies_s]
+    return {
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies_ms), 3),
+        "throughput_per_s": round(items / wall_s, 2) if wall_s > 0 else 0.0,
+        "samples": len(latencies_ms),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+# --- Mise en place hors ligne ---
+def setup(model_kind: str, seed: int):
+    """Configure main.py avec des stubs (Twitter, MongoDB) et le modèle demandé, sans lifespan."""
+    if model_kind == "real":
+        from backends import load_fp32_model, load_tokenizer, model_weights_path
+        weights_path = model_weights_path(main.MODEL_PATH)
+        if not os.path.exists(weights_path):
+            print(f"❌ Modèle réel introuvable ({weights_path}).")
+            sys.exit(1)
+        tokenizer = load_tokenizer()
+        model = load_fp32_model(main.MODEL_PATH, torch.device("cpu"))
+    else:
+        tokenizer = tiny_tokenizer()
+        model = tiny_model(len(tokenizer), seed=seed)
+        weights_file = tempfile.NamedTemporaryFile(prefix="bench-weights-", delete=False)
+        weights_file.write(b"tiny-random-bert")
+        weights_file.close()
+        weights_path = weights_file.name
+
+    database.db_handler.db = in_memory_database()
+    main.twitter_client = StubTwitterClient(seed=seed)
+    main.tokenizer = tokenizer
+    main.model = model
+    main.device = torch.device("cpu")
+    # Même moteur que load_ai_resources : prétraitement d'entraînement si SERVING_PREPROCESS
+    from preprocessing import preprocess_text
+    main.inference_engine = InferenceEngine(
+        model, tokenizer, main.device,
+        preprocess=preprocess_text if main.SERVING_PREPROCESS else None
+    )
+    main.inference_engine.start()
+    # Cache neutralisé (0 entrée, pas de MongoDB) : chaque texte passe par le modèle
+    main.prediction_cache = PredictionCache(weights_path, max_entries=0, use_mongo=False)
+    main.model_ready.set()
+    return tokenizer, model
+
+
+# --- Scénarios ---
+def bench_tokenization(tokenizer, rng, repeats: int) -> dict:
+    results = {}
+    for n_words in TEXT_LENGTHS:
+        for batch_size in BATCH_SIZES:
+            texts = [make_text(rng, n_words) for _ in range(batch_size)]
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                tokenizer(texts, padding=True, truncation=True, max_length=512, return_tensors="pt")
+                latencies.append(time.perf_counter() - t0)
+            results[f"tokenize/words={n_words}/batch={batch_size}"] = summarize(latencies, repeats * batch_size, time.perf_counter() - start)
+    return results
+
+
+def bench_forward(model, tokenizer, rng, repeats: int) -> dict:
+    results = {}
+    for n_words in TEXT_LENGTHS:
+        for batch_size in BATCH_SIZES:
+            inputs = tokenizer([make_text(rng, n_words) for _ in range(batch_size)],
+                               padding=True, truncation=True, max_length=512, return_tensors="pt")
+            with torch.no_grad():
+                model(**inputs) # Préchauffage
+                latencies = []
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    t0 = time.perf_counter()
+                    model(**inputs)
+                    latencies.append(time.perf_counter() - t0)
+            results[f"forward/words={n_words}/batch={batch_size}"] = summarize(latencies, repeats * batch_size, time.perf_counter() - start)
+    return results
+
+
+def bench_predict(rng, repeats: int) -> dict:
+    results = {}
+    for n_words in TEXT_LENGTHS:
+        texts = [make_text(rng, n_words) for _ in range(repeats)]
+        latencies = []
+        start = time.perf_counter()
+        for text in texts:
+            t0 = time.perf_counter()
+            main.predict_mental_state(text)
+            latencies.append(time.perf_counter() - t0)
+        results[f"predict_mental_state/words={n_words}"] = summarize(latencies, len(texts), time.perf_counter() - start)
+    return results
+
+
+async def _analyze_round(tweet_count: int, concurrency: int, requests_per_worker: int, prefix: str) -> tuple[list, float]:
+    latencies = []
+
+    async def worker(worker_id: int):
+        for i in range(requests_per_worker):
+            request = main.AnalyzeRequest(username=f"{prefix}_{worker_id}_{i}", max_tweets=tweet_count)
+            t0 = time.perf_counter()
+            await main.analyze_profile(request, ANALYZE_HTTP_REQUEST)
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def bench_analyze(requests_per_worker: int) -> dict:
+    results = {}
+    main.twitter_executor.start()
+    for n_words in TEXT_LENGTHS:
+        main.twitter_client.words_per_tweet = n_words
+        for tweet_count in TWEET_COUNTS:
+            for concurrency in CONCURRENCY_LEVELS:
+                prefix = f"bench_w{n_words}_t{tweet_count}_c{concurrency}"
+                latencies, wall = asyncio.run(_analyze_round(tweet_count, concurrency, requests_per_worker, prefix))
+                key = f"analyze_profile/words={n_words}/tweets={tweet_count}/concurrency={concurrency}"
+                # Débit exprimé en tweets analysés par seconde
+                results[key] = summarize(latencies, len(latencies) * tweet_count, wall)
+    main.twitter_executor.shutdown()
+    return results
+
+
+# --- Baselines ---
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Liste des régressions : p95 plus lent ou débit plus faible de plus de `threshold`."""
+    regressions = []
+    for name, base in baseline.get("scenarios", {}).items():
+        now = current["scenarios"].get(name)
+        if now is None:
+            continue
+        if base["p95_ms"] > 0 and now["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {now['p95_ms']} ms")
+        if base["throughput_per_s"] > 0 and now["throughput_per_s"] < base["throughput_per_s"] * (1 - threshold):
+            regressions.append(f"{name}: débit {base['throughput_per_s']} -> {now['throughput_per_s']} /s")
+    base_rss = baseline.get("peak_rss_mb")
+    if base_rss and current["peak_rss_mb"] > base_rss * (1 + threshold):
+        regressions.append(f"peak_rss_mb: {base_rss} -> {current['peak_rss_mb']} Mo")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmarks hors ligne du pipeline d'analyse.")
+    parser.add_argument("--model", choices=["tiny", "real"], default="tiny")
+    parser.add_argument("--repeats", type=int, default=20, help="Répétitions par scénario micro-benchmark")
+    parser.add_argument("--requests-per-worker", type=int, default=3, help="Requêtes /analyze par client concurrent")
+    parser.add_argument("--only", nargs="*", choices=["tokenize", "forward", "predict", "analyze"],
+                        default=["tokenize", "forward", "predict", "analyze"])
+    parser.add_argument("--threads", type=int, default=0, help="torch.set_num_threads (0 = défaut)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--save", default=None, help="Écrit les résultats JSON (baseline)")
+    parser.add_argument("--compare", default=None, help="Baseline JSON à comparer")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Régression tolérée (0.15 = 15 %%)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    rng = random.Random(args.seed)
+    tokenizer, model = setup(args.model, args.seed)
+
+    scenarios = {}
+    if "tokenize" in args.only:
+        scenarios.update(bench_tokenization(tokenizer, rng, args.repeats))
+    if "forward" in args.only:
+        scenarios.update(bench_forward(model, tokenizer, rng, args.repeats))
+    if "predict" in args.only:
+        scenarios.update(bench_predict(rng, args.repeats))
+    if "analyze" in args.only:
+        scenarios.update(bench_analyze(args.requests_per_worker))
+    main.inference_engine.stop()
+
+    report = {
+        "meta": {
+            "model": args.model,
+            "serving_preprocess": main.SERVING_PREPROCESS,
+            "torch_threads": torch.get_num_threads(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "machine": platform.machine(),
+            "seed": args.seed,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "scenarios": scenarios,
+    }
+
+    print(f"\n{'Scénario':<72} {'p50':>9} {'p95':>9} {'p99':>9} {'débit/s':>10}")
+    for name, stats in scenarios.items():
+        print(f"{name:<72} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['throughput_per_s']:>10.1f}")
+    print(f"\nPic de RSS: {report['peak_rss_mb']} Mo")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Résultats enregistrés dans {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} régression(s) au-delà de {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"✅ Aucune régression au-delà de {args.threshold:.0%} par rapport à {args.compare}.")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,156 @@
+# benchmarks/bench_preprocessing.py - Débit et concordance du prétraitement : notebook vs preprocessing.py
+#
+# Usage (depuis la racine du dépôt):
+#   python -m benchmarks.bench_preprocessing                          # corpus synthétique dérivé de data-final.csv
+#   python -m benchmarks.bench_preprocessing --csv raw.csv --rows 20000
+#
+# La référence reproduit à l'identique les cellules du notebook (un .apply par étape,
+# word_tokenize de NLTK, remplacement des emojis un par un). Elle n'emprunte rien à
+# preprocessing.py : stop words de nltk.corpus.stopwords, chat_words et emoji_dict lus tels
+# quels dans les cellules du notebook, pour qu'une régression de nos tables soit détectée.
+# Nécessite nltk et les ressources 'stopwords', 'punkt' / 'punkt_tab'.
+# Code de sortie 1 si la concordance est sous --min-agreement.
+
+# --- Standard Libraries ---
+import argparse
+import ast
+import json
+import random
+import re
+import string
+import sys
+import time
+
+# --- Third-Party Libraries ---
+import pandas as pd
+from nltk.corpus import stopwords
+from nltk.stem import PorterStemmer
+from nltk.tokenize import word_tokenize
+
+# --- Local Application Imports ---
+from benchmarks.stubs import WORDS
+from preprocessing import preprocess_series, preprocess_text
+
+NOTEBOOK_PATH = "bert-best-2 (2).ipynb"
+
+NOISE = [
+    "<b>", "</b>", "<br/>", "https://t.co/abc123", "www.example.com/page",
+    "ASAP", "afk", "AFAIK", "cannot", "gonna", "don't", "“quoted”", "!!!", "...",
+]
+
+
+# --- Référence : cellules du notebook ---
+def notebook_tables(path: str = NOTEBOOK_PATH) -> dict:
+    """
+    Valeurs littérales des affectations `chat_words = {...}` et `emoji_dict = {...}` du notebook
+    (le second dictionnaire de la cellule chat_words n'est affecté à rien : il est ignoré, comme à l'exécution).
+    """
+    with open(path, encoding="utf-8") as f:
+        cells = json.load(f)["cells"]
+    tables = {}
+    for cell in cells:
+        if cell.get("cell_type") != "code":
+            continue
+        try:
+            tree = ast.parse("".join(cell["source"]))
+        except SyntaxError: # Cellules avec commandes shell (!pip ...)
+            continue
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict):
+                for target in node.targets:
+                    if isinstance(target, ast.Name) and target.id in ("chat_words", "emoji_dict"):
+                        tables[target.id] = ast.literal_eval(node.value)
+    missing = {"chat_words", "emoji_dict"} - set(tables)
+    if missing:
+        raise ValueError(f"Tables introuvables dans {path}: {sorted(missing)}")
+    return tables
+
+
+_NOTEBOOK = notebook_tables()
+CHAT_WORDS = _NOTEBOOK["chat_words"]
+EMOJI_LABELS = _NOTEBOOK["emoji_dict"]
+STOP_WORDS = set(stopwords.words("english"))
+_reference_stemmer = PorterStemmer()
+
+
+def reference_preprocess(text):
+    if not isinstance(text, str):
+        return text
+    text = text.lower()
+    text = re.sub(r'<.*?>', '', text)
+    text = re.compile(r'https?://\S+|www\.\S+').sub(r'', text)
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    text = " ".join(CHAT_WORDS[w.upper()] if w.upper() in CHAT_WORDS else w for w in text.split())
+    text = " ".join(word for word in text.split() if word.lower() not in STOP_WORDS)
+    text = " ".join(_reference_stemmer.stem(word) for word in word_tokenize(text))
+    for emoji, label in EMOJI_LABELS.items():
+        text = text.replace(emoji, f" {label} ")
+    return text
+
+
+# --- Corpus ---
+def synthetic_corpus(rows: int, seed: int) -> pd.Series:
+    """Phrases de data-final.csv (ou du vocabulaire des stubs) bruitées avec HTML, URLs, emojis et chat words."""
+    rng = random.Random(seed)
+    try:
+        base = pd.read_csv("data-final.csv", usecols=["statement"])["statement"].dropna().astype(str).tolist()
+    except (FileNotFoundError, ValueError):
+        base = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))) for _ in range(1000)]
+    emojis = list(EMOJI_LABELS)
+
+    texts = []
+    for _ in range(rows):
+        words = rng.choice(base).split()
+        for _ in range(rng.randint(1, 6)):
+            noise = rng.choice(NOISE) if rng.random() < 0.7 else rng.choice(emojis)
+            words.insert(rng.randint(0, len(words)), noise)
+        texts.append(" ".join(words))
+    return pd.Series(texts)
+
+
+def timed(func, *args) -> tuple[object, float]:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Compare le prétraitement du notebook et preprocessing.py.")
+    parser.add_argument("--csv", default=None, help="CSV brut (colonne 'text' ou 'statement') ; sinon corpus synthétique")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    if args.csv:
+        raw = pd.read_csv(args.csv, nrows=args.rows)
+        texts = raw["text" if "text" in raw.columns else "statement"]
+    else:
+        texts = synthetic_corpus(args.rows, args.seed)
+
+    reference, reference_s = timed(lambda s: s.apply(reference_preprocess), texts)
+    single, single_s = timed(lambda s: [preprocess_text(text) for text in s], texts)
+    vectorized, vectorized_s = timed(preprocess_series, texts)
+
+    agreement = (reference == pd.Series(single, index=texts.index)).mean()
+    series_agreement = (reference == vectorized).mean()
+
+    print(f"\n{'Implémentation':<34} {'temps (s)':>10} {'lignes/s':>12} {'accélération':>13}")
+    for name, elapsed in (("notebook (.apply par étape)", reference_s),
+                          ("preprocess_text (service)", single_s),
+                          ("preprocess_series (entraînement)", vectorized_s)):
+        print(f"{name:<34} {elapsed:>10.2f} {len(texts) / elapsed:>12.1f} {reference_s / elapsed:>12.1f}x")
+    print(f"\nConcordance avec le notebook: preprocess_text {agreement:.2%}, preprocess_series {series_agreement:.2%}")
+
+    mismatches = texts[reference != vectorized]
+    for text in mismatches.head(5):
+        print(f"   ≠ {text!r}\n     notebook: {reference_preprocess(text)!r}\n     nouveau : {preprocess_text(text)!r}")
+
+    if min(agreement, series_agreement) < args.min_agreement:
+        print(f"❌ Concordance sous le seuil ({args.min_agreement:.0%}).")
+        sys.exit(1)
+    print("✅ Concordance suffisante.")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,99 @@
+# benchmarks/bench_response.py - Taille et coût d'encodage des réponses /analyze : défaut vs compact
+#
+# Usage (depuis la racine du dépôt):
+#   python -m benchmarks.bench_response
+#   python -m benchmarks.bench_response --tweets 100 --repeats 500
+#
+# "défaut" reproduit l'encodage FastAPI d'un AnalysisResult (jsonable_encoder + json.dumps) ;
+# les variantes compactes passent par response_encoding.py (orjson et brotli si installés).
+
+# --- Standard Libraries ---
+import argparse
+import json
+import random
+import time
+from types import SimpleNamespace
+
+# --- Third-Party Libraries ---
+from fastapi.encoders import jsonable_encoder
+
+# --- Local Application Imports ---
+import response_encoding
+from benchmarks.stubs import make_text
+from labels import CLASS_LABELS
+
+
+def fake_result(tweets: int, seed: int) -> SimpleNamespace:
+    """Un AnalysisResult plausible : probabilités à 2 décimales, textes de longueur variable."""
+    rng = random.Random(seed)
+    predictions = []
+    for i in range(tweets):
+        weights = [rng.random() for _ in CLASS_LABELS]
+        probabilities = {label: round(w / sum(weights) * 100, 2) for label, w in zip(CLASS_LABELS, weights)}
+        predictions.append(SimpleNamespace(
+            id=1_700_000_000_000_000_000 + i,
+            text=make_text(rng, rng.randint(5, 50)),
+            created_at="2024-05-01T12:00:00+00:00",
+            likes=rng.randint(0, 500),
+            retweets=rng.randint(0, 50),
+            predicted_state=max(probabilities, key=probabilities.get),
+            probabilities=probabilities,
+            answered_by=rng.choice(["bert", "student"]),
+        ))
+    return SimpleNamespace(
+        username="bench_user", tweets_analyzed=tweets,
+        overall_summary={label: 20.0 for label in CLASS_LABELS}, predictions=predictions,
+    )
+
+
+def default_body(result) -> bytes:
+    """Encodage par défaut de FastAPI (JSONResponse)."""
+    content = jsonable_encoder({
+        "username": result.username,
+        "tweets_analyzed": result.tweets_analyzed,
+        "overall_summary": result.overall_summary,
+        "predictions": [vars(p) for p in result.predictions],
+    })
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def bench(func, repeats: int) -> tuple[bytes, float]:
+    body = func()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return body, (time.perf_counter() - start) / repeats
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Compare les réponses /analyze par défaut et compactes.")
+    parser.add_argument("--tweets", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    result = fake_result(args.tweets, args.seed)
+    variants = [("défaut (FastAPI)", lambda: default_body(result))]
+    for include_text in (True, False):
+        suffix = "" if include_text else ", sans texte"
+        payload = lambda include_text=include_text: response_encoding.compact_analysis(result, include_text)
+        variants.append((f"compact{suffix}", lambda payload=payload: response_encoding.dumps(payload())))
+        for encoding in ("gzip", "br"):
+            if encoding == "br" and response_encoding.brotli is None:
+                continue
+            variants.append((f"compact{suffix} + {encoding}",
+                             lambda payload=payload, encoding=encoding:
+                             response_encoding.compress(response_encoding.dumps(payload()), encoding)))
+
+    print(f"{args.tweets} tweets | orjson: {'oui' if response_encoding.orjson else 'non'} "
+          f"| brotli: {'oui' if response_encoding.brotli else 'non'}")
+    print(f"\n{'Variante':<28} {'octets':>9} {'ratio':>7} {'encodage (ms)':>14}")
+    reference_size = None
+    for name, func in variants:
+        body, elapsed = bench(func, args.repeats)
+        reference_size = reference_size or len(body)
+        print(f"{name:<28} {len(body):>9} {len(body) / reference_size:>7.2f} {elapsed * 1000:>14.3f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,60 @@
+# benchmarks/stubs.py - Remplaçants hors ligne : client Twitter, MongoDB en mémoire (petit BERT : tiny_bert.py)
+
+# --- Standard Libraries ---
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+# --- Local Application Imports ---
+from tiny_bert import WORDS # Vocabulaire partagé avec le petit BERT (tiny_bert.py)
+
+
+def make_text(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+class StubTwitterClient:
+    """
+    Remplace tweepy.Client : mêmes méthodes que celles appelées par twitter_ingestion.TwitterIngestion
+    (get_user, get_users_tweets),
+    réponses générées localement, latence réseau simulée optionnelle.
+    """
+
+    def __init__(self, words_per_tweet: int = 20, latency_ms: float = 0.0, seed: int = 0):
+        self.words_per_tweet = words_per_tweet
+        self.latency = latency_ms / 1000.0
+        self.seed = seed
+        self._tweet_ids = itertools.count(10**15)
+        self.calls = 0
+
+    def _sleep(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_user(self, username: str, **kwargs):
+        self._sleep()
+        return SimpleNamespace(data=SimpleNamespace(id=abs(hash(username)) % 10**12, username=username))
+
+    def get_users_tweets(self, id, max_results: int = 10, **kwargs):
+        self._sleep()
+        rng = random.Random(f"{self.seed}-{id}-{kwargs.get('pagination_token')}")
+        now = datetime.now(timezone.utc)
+        tweets = [
+            SimpleNamespace(
+                id=next(self._tweet_ids),
+                text=make_text(rng, self.words_per_tweet),
+                created_at=now - timedelta(minutes=i),
+                public_metrics={"like_count": rng.randint(0, 50), "retweet_count": rng.randint(0, 10)},
+            )
+            for i in range(max_results)
+        ]
+        return SimpleNamespace(data=tweets, meta={"result_count": len(tweets)})
+
+
+def in_memory_database(name: str = "bench_db"):
+    """Base MongoDB en mémoire (mongomock) compatible avec l'API pymongo utilisée par l'application."""
+    import mongomock
+    return mongomock.MongoClient()[name]
@@ -0,0 +1,230 @@
+# bulk_score.py - Scoring hors ligne de gros corpus CSV (statement[,status]) en parallèle
+#
+# Usage:
+#   python bulk_score.py data-final.csv scores/ --workers 4 --threads-per-worker 2
+#   python bulk_score.py big.csv scores/ --chunk-size 5000     # relancer la même commande reprend le travail
+#
+# - Le CSV est lu par morceaux (jamais chargé en entier).
+# - Chaque morceau est scoré par un processus du pool ; chaque processus charge le modèle
+#   une fois (même chargement et mêmes labels que l'API) avec son propre budget de threads intra-op.
+# - Chaque morceau produit scores/part-XXXXX.parquet : un morceau déjà écrit est sauté à la reprise.
+# - scores/manifest.json décrit le run (CSV, taille de morceau, modèle, backend, prétraitement) :
+#   la reprise est refusée si la commande ne correspond plus aux parts déjà écrites.
+# - À la fin : scores/summary.json avec débit (lignes/s) et matrice de confusion contre 'status'.
+
+# --- Standard Libraries ---
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# --- Third-Party Libraries ---
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+# --- Local Application Imports ---
+from labels import CLASS_LABELS
+
+PART_PATTERN = "part-{:05d}.parquet"
+PART_RE = re.compile(r"^part-(\d{5})\.parquet$")
+MANIFEST_NAME = "manifest.json"
+
+# Modèle et moteur propres à chaque processus du pool (initialisés par _init_worker)
+_worker_engine = None
+
+
+def _init_worker(model_path: str, backend: str, threads: int, batch_size: int, preprocess: bool):
+    """Charge le modèle une seule fois par processus, avec un budget de threads dédié."""
+    global _worker_engine
+    import torch
+    from backends import load_backend, load_tokenizer
+    from inference import InferenceEngine
+    from preprocessing import preprocess_text
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    tokenizer = load_tokenizer()
+    model, device = load_backend(backend, model_path, torch.device("cpu"), threads=threads)
+    # Pas de limite de file : le processus ne sert que ses propres morceaux
+    _worker_engine = InferenceEngine(
+        model, tokenizer, device,
+        max_batch_size=batch_size, max_wait_ms=0, max_queue_size=0,
+        preprocess=preprocess_text if preprocess else None
+    )
+
+
+def _score_chunk(chunk_index: int, chunk: pd.DataFrame, output_dir: str) -> tuple[int, int]:
+    """Score un morceau et l'écrit atomiquement en Parquet. Retourne (index, nombre de lignes)."""
+    texts = chunk["statement"].fillna("").astype(str).tolist()
+    predictions = _worker_engine.predict_many(texts)
+
+    columns = {
+        "row_id": chunk.index.to_numpy(),
+        "statement": texts,
+        "predicted_state": [label for label, _ in predictions],
+    }
+    for label in CLASS_LABELS:
+        columns[f"prob_{label}"] = [probabilities[label] for _, probabilities in predictions]
+    if "status" in chunk.columns:
+        columns["status"] = chunk["status"].astype(str).tolist()
+
+    path = os.path.join(output_dir, PART_PATTERN.format(chunk_index))
+    tmp_path = path + ".tmp"
+    pq.write_table(pa.table(columns), tmp_path)
+    os.replace(tmp_path, path) # Un fichier part n'existe que s'il est complet : la reprise s'y fie
+    return chunk_index, len(chunk)
+
+
+def run_manifest(args) -> dict:
+    """Tout ce qui détermine le contenu des parts : deux runs ne se complètent que s'ils sont identiques."""
+    from backends import model_weights_path
+    from prediction_cache import file_fingerprint
+    from preprocessing import PREPROCESSING_VERSION
+
+    stat = os.stat(args.csv_path)
+    weights_path = model_weights_path(args.model_path)
+    return {
+        "csv_path": os.path.abspath(args.csv_path),
+        "csv_size": stat.st_size,
+        "csv_mtime_ns": stat.st_mtime_ns,
+        "chunk_size": args.chunk_size,
+        "model_fingerprint": file_fingerprint(weights_path),
+        "backend": args.backend,
+        "preprocess": args.preprocess,
+        "preprocessing_version": PREPROCESSING_VERSION if args.preprocess else None,
+    }
+
+
+def completed_parts(output_dir: str) -> set[int]:
+    return {
+        int(match.group(1))
+        for match in (PART_RE.match(name) for name in os.listdir(output_dir))
+        if match
+    }
+
+
+def check_manifest(output_dir: str, manifest: dict, done: set[int]):
+    """Écrit le manifeste d'un nouveau run ; refuse de reprendre des parts produites autrement."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            previous = json.load(f)
+        mismatched = sorted(key for key in manifest if previous.get(key) != manifest[key])
+        if done and mismatched:
+            print(f"❌ {output_dir} contient des parts d'un run différent ({', '.join(mismatched)} changé).")
+            print("   Utilisez un autre dossier de sortie ou videz celui-ci.")
+            sys.exit(1)
+    elif done:
+        print(f"❌ {output_dir} contient des parts sans {MANIFEST_NAME} : impossible de vérifier qu'elles sont compatibles.")
+        sys.exit(1)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def confusion_matrix(output_dir: str) -> dict | None:
+    """Matrice de confusion status (lignes) x prédiction (colonnes), labels comparés sans casse."""
+    parts = [os.path.join(output_dir, PART_PATTERN.format(index)) for index in sorted(completed_parts(output_dir))]
+    if not parts:
+        return None
+    frames = []
+    for part in parts:
+        if "status" not in pq.read_schema(part).names:
+            return None
+        frames.append(pq.read_table(part, columns=["status", "predicted_state"]).to_pandas())
+    data = pd.concat(frames, ignore_index=True)
+
+    canonical = {label.lower(): label for label in CLASS_LABELS}
+    truth = data["status"].str.strip().str.lower().map(canonical).fillna("Other")
+    matrix = pd.crosstab(truth, data["predicted_state"]).reindex(
+        index=CLASS_LABELS + (["Other"] if (truth == "Other").any() else []),
+        columns=CLASS_LABELS,
+        fill_value=0
+    ).astype(int)
+    known = truth != "Other"
+    accuracy = float((truth[known] == data["predicted_state"][known]).mean()) if known.any() else None
+    return {
+        "labels": CLASS_LABELS,
+        "matrix": {index: row.to_dict() for index, row in matrix.iterrows()},
+        "accuracy": round(accuracy, 4) if accuracy is not None else None,
+    }
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Scoring hors ligne d'un CSV (statement[,status]).")
+    parser.add_argument("csv_path")
+    parser.add_argument("output_dir", help="Dossier de sortie (fichiers Parquet + summary.json)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Lignes par morceau (fixe pour pouvoir reprendre)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--threads-per-worker", type=int, default=2, help="Threads intra-op torch par processus")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--backend", default=os.getenv("INFERENCE_BACKEND", "pytorch"))
+    parser.add_argument("--preprocess", action="store_true",
+                        help="Appliquer le prétraitement d'entraînement (textes bruts ; data-final.csv est déjà prétraité)")
+    parser.add_argument("--model-path", default=os.getenv("MODEL_PATH", "model/bert_mental_health_model.bin"))
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    done = completed_parts(args.output_dir)
+    check_manifest(args.output_dir, run_manifest(args), done)
+    if done:
+        print(f"♻️ Reprise: {len(done)} morceaux déjà scorés seront sautés.")
+
+    print(f"🚀 Scoring de {args.csv_path} ({args.workers} processus x {args.threads_per_worker} threads)...")
+    start_time = time.perf_counter()
+    scored_rows = 0
+    max_in_flight = args.workers * 2 # Borne la mémoire : on ne lit pas plus vite qu'on ne score
+
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(args.model_path, args.backend, args.threads_per_worker, args.batch_size, args.preprocess)
+    ) as pool:
+        in_flight = set()
+        reader = pd.read_csv(args.csv_path, chunksize=args.chunk_size)
+        for chunk_index, chunk in enumerate(reader):
+            if chunk_index in done:
+                continue
+            if "statement" not in chunk.columns:
+                print("❌ Le CSV doit contenir une colonne 'statement'.")
+                sys.exit(1)
+            in_flight.add(pool.submit(_score_chunk, chunk_index, chunk, args.output_dir))
+            if len(in_flight) >= max_in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    _, rows = future.result()
+                    scored_rows += rows
+                elapsed = time.perf_counter() - start_time
+                print(f"   📈 {scored_rows} lignes scorées ({scored_rows / elapsed:.1f} lignes/s)")
+        for future in in_flight:
+            _, rows = future.result()
+            scored_rows += rows
+
+    elapsed = time.perf_counter() - start_time
+    summary = {
+        "csv_path": args.csv_path,
+        "rows_scored_this_run": scored_rows,
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(scored_rows / elapsed, 2) if elapsed > 0 else None,
+        "workers": args.workers,
+        "threads_per_worker": args.threads_per_worker,
+        "backend": args.backend,
+        "confusion_matrix": confusion_matrix(args.output_dir),
+    }
+    with open(os.path.join(args.output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ {scored_rows} lignes scorées en {elapsed:.1f} s ({summary['rows_per_s']} lignes/s).")
+    if summary["confusion_matrix"]:
+        print(f"   🎯 Précision contre 'status': {summary['confusion_matrix']['accuracy']}")
+
+
+if __name__ == "__main__":
+    main()
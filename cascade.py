@@ -0,0 +1,183 @@
+# cascade.py - Cascade de modèles : un élève linéaire rapide, BERT pour les cas ambigus ou à risque
+
+# --- Standard Libraries ---
+import asyncio
+import json
+import os
+import zlib
+
+# --- Third-Party Libraries ---
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+# --- Local Application Imports ---
+from labels import (
+    CLASS_LABELS, NUM_LABELS, INVALID_INPUT_LABEL, FULL_MODEL, STUDENT_MODEL, empty_probabilities
+)
+from metrics import CASCADE_ANSWERS
+
+# --- Configuration ---
+STUDENT_DIR = os.getenv("CASCADE_STUDENT_DIR", "model/student")                     # Produit par distill.py
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", "0.9"))                    # Confiance min. de l'élève
+CASCADE_RISK_THRESHOLD = float(os.getenv("CASCADE_RISK_THRESHOLD", "0.05"))         # P(risque) qui force BERT
+# Labels dont la probabilité (>= CASCADE_RISK_THRESHOLD) envoie toujours le texte au modèle complet
+CASCADE_RISK_LABELS = [
+    label.strip() for label in os.getenv("CASCADE_RISK_LABELS", "Potential Suicide Post").split(",") if label.strip()
+]
+HASH_BUCKETS = 1 << 18
+NGRAMS = 2
+
+
+def hashed_features(text: str, num_buckets: int = HASH_BUCKETS, ngrams: int = NGRAMS) -> list[int]:
+    """Indices hachés (crc32, stable entre processus) des n-grammes de mots du texte."""
+    words = text.lower().split()
+    features = []
+    for n in range(1, ngrams + 1):
+        for i in range(len(words) - n + 1):
+            features.append(zlib.crc32(" ".join(words[i:i + n]).encode("utf-8")) % num_buckets)
+    return features
+
+
+class HashedLinearStudent(nn.Module):
+    """
+    Classifieur linéaire sur n-grammes hachés (moyenne des poids de chaque n-gramme + biais),
+    distillé depuis les probabilités de BERT. Quelques microsecondes par texte sur CPU.
+    """
+
+    def __init__(self, num_buckets: int = HASH_BUCKETS, ngrams: int = NGRAMS):
+        super().__init__()
+        self.num_buckets = num_buckets
+        self.ngrams = ngrams
+        self.metadata = {} # Renseigné par distill.py (prétraitement, rapport de distillation)
+        self.embedding = nn.EmbeddingBag(num_buckets, NUM_LABELS, mode="mean")
+        self.bias = nn.Parameter(torch.zeros(NUM_LABELS))
+        nn.init.zeros_(self.embedding.weight)
+
+    def featurize(self, texts: list[str]) -> tuple[torch.Tensor, torch.Tensor]:
+        ids, offsets = [], []
+        for text in texts:
+            offsets.append(len(ids))
+            ids.extend(hashed_features(text, self.num_buckets, self.ngrams))
+        return torch.tensor(ids, dtype=torch.long), torch.tensor(offsets, dtype=torch.long)
+
+    def forward(self, ids: torch.Tensor, offsets: torch.Tensor) -> torch.Tensor:
+        return self.embedding(ids, offsets) + self.bias
+
+    def predict_proba(self, texts: list[str]) -> torch.Tensor:
+        """Probabilités (N x NUM_LABELS, entre 0 et 1)."""
+        with torch.no_grad():
+            return F.softmax(self(*self.featurize(texts)), dim=1)
+
+    # --- Sauvegarde ---
+    def save(self, directory: str, metadata: dict | None = None):
+        os.makedirs(directory, exist_ok=True)
+        torch.save(self.state_dict(), os.path.join(directory, "student.pt"))
+        config = {"num_buckets": self.num_buckets, "ngrams": self.ngrams, "labels": CLASS_LABELS, **(metadata or {})}
+        with open(os.path.join(directory, "student.json"), "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, directory: str = STUDENT_DIR) -> "HashedLinearStudent":
+        with open(os.path.join(directory, "student.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        if config["labels"] != CLASS_LABELS:
+            raise ValueError(f"Labels de l'élève {config['labels']} différents de CLASS_LABELS.")
+        student = cls(config["num_buckets"], config["ngrams"])
+        student.metadata = config
+        student.load_state_dict(torch.load(os.path.join(directory, "student.pt"), map_location="cpu"))
+        return student.eval()
+
+
+def should_escalate(probabilities: list[float], threshold: float = CASCADE_THRESHOLD,
+                    risk_threshold: float = CASCADE_RISK_THRESHOLD,
+                    risk_labels: list[str] = CASCADE_RISK_LABELS) -> bool:
+    """BERT tranche si l'élève hésite, ou si un label à risque n'est pas franchement exclu."""
+    if max(probabilities) < threshold:
+        return True
+    return any(probabilities[CLASS_LABELS.index(label)] >= risk_threshold for label in risk_labels)
+
+
+def _as_prediction(probabilities: list[float]) -> tuple[str, dict]:
+    """Même format que le moteur BERT : (label, probabilités en % arrondies à 2 décimales)."""
+    best = max(range(NUM_LABELS), key=lambda i: probabilities[i])
+    return CLASS_LABELS[best], {CLASS_LABELS[i]: round(p * 100, 2) for i, p in enumerate(probabilities)}
+
+
+class CascadeEngine:
+    """
+    Répond avec l'élève quand il est confiant et que le texte n'est pas à risque ;
+    sinon délègue au moteur BERT (micro-batching, admission control inchangés).
+    Chaque résultat est (label, probabilités, modèle ayant répondu).
+    """
+
+    def __init__(self, student: HashedLinearStudent, engine, preprocess=None,
+                 threshold: float = CASCADE_THRESHOLD,
+                 risk_threshold: float = CASCADE_RISK_THRESHOLD,
+                 risk_labels: list[str] = CASCADE_RISK_LABELS):
+        unknown = set(risk_labels) - set(CLASS_LABELS)
+        if unknown:
+            raise ValueError(f"CASCADE_RISK_LABELS inconnus: {sorted(unknown)}")
+        self.student = student
+        self.engine = engine
+        self.preprocess = preprocess # Même prétraitement que le corpus de distillation
+        self.threshold = threshold
+        self.risk_threshold = risk_threshold
+        self.risk_labels = risk_labels
+        self.student_answers = 0
+        self.escalations = 0
+
+    @property
+    def config_fingerprint(self) -> str:
+        """Entre dans l'empreinte du cache : changer de seuils change les réponses."""
+        return f"cascade-{self.threshold}-{self.risk_threshold}-{'|'.join(self.risk_labels)}"
+
+    def _student_pass(self, texts: list[str]) -> tuple[list, list[int]]:
+        """Réponses de l'élève (None = à escalader) et indices des textes à envoyer à BERT."""
+        results = [None] * len(texts)
+        valid = []
+        for i, text in enumerate(texts):
+            if text and isinstance(text, str):
+                valid.append(i)
+            else:
+                results[i] = (INVALID_INPUT_LABEL, empty_probabilities(), STUDENT_MODEL)
+        escalate = []
+        if valid:
+            inputs = [texts[i] for i in valid]
+            if self.preprocess is not None:
+                inputs = [self.preprocess(text) for text in inputs]
+            for i, probabilities in zip(valid, self.student.predict_proba(inputs).tolist()):
+                if should_escalate(probabilities, self.threshold, self.risk_threshold, self.risk_labels):
+                    escalate.append(i)
+                else:
+                    results[i] = (*_as_prediction(probabilities), STUDENT_MODEL)
+        self.student_answers += len(valid) - len(escalate)
+        self.escalations += len(escalate)
+        CASCADE_ANSWERS.labels(STUDENT_MODEL).inc(len(valid) - len(escalate))
+        CASCADE_ANSWERS.labels(FULL_MODEL).inc(len(escalate))
+        return results, escalate
+
+    def classify_many(self, texts: list[str]) -> list:
+        results, escalate = self._student_pass(texts)
+        for i, (label, probabilities) in zip(escalate, self.engine.predict_many([texts[i] for i in escalate])):
+            results[i] = (label, probabilities, FULL_MODEL)
+        return results
+
+    async def classify_many_async(self, texts: list[str]) -> list:
+        results, escalate = await asyncio.to_thread(self._student_pass, texts)
+        if escalate:
+            predictions = await self.engine.predict_many_async([texts[i] for i in escalate])
+            for i, (label, probabilities) in zip(escalate, predictions):
+                results[i] = (label, probabilities, FULL_MODEL)
+        return results
+
+    def stats(self) -> dict:
+        total = self.student_answers + self.escalations
+        return {
+            "student_answers": self.student_answers,
+            "escalations": self.escalations,
+            "escalation_rate": round(self.escalations / total, 4) if total else 0.0,
+            "threshold": self.threshold,
+            "risk_threshold": self.risk_threshold,
+            "risk_labels": self.risk_labels,
+        }
@@ -1,9 +1,11 @@
 # database.py (Version Synchrone avec Pymongo - Corrigée)
 
 import os
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase # Couche asynchrone (routes async, helpers en masse)
+from pymongo import ASCENDING, IndexModel, MongoClient, UpdateOne
 from pymongo.database import Database # Pour le type hint de get_db
 from dotenv import load_dotenv
+from metrics import MongoCommandMetrics # Latence des commandes MongoDB (/metrics)
 import sys # Pour quitter en cas d'échec critique
 import traceback # Utile pour le débogage
 
@@ -20,12 +22,41 @@ if not MONGO_DETAILS or not DATABASE_NAME:
     print("   ‼️ L'application ne peut pas fonctionner sans base de données. Arrêt.")
     sys.exit(1) # Quitter si la configuration manque
 
+# --- Pools de connexions ---
+# Le client synchrone (ingestion Twitter, cache des prédictions, dans des threads) et le client
+# asynchrone (lectures de l'historique par les routes async) ont chacun leur pool :
+# le trafic /analyze ne prive pas ces lectures de connexions.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))                  # Connexions max par client
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))                    # Connexions gardées ouvertes
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))          # Fermeture des connexions inactives
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")) # Attente max d'une connexion libre
+
+# --- Pagination et écritures en masse ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+BULK_CHUNK_SIZE = 1000 # Documents par bulk_write
+
 print(f"🗄️ Configuration MongoDB: URI={MONGO_DETAILS}, DB={DATABASE_NAME}")
 
+
+def pool_options() -> dict:
+    """Options de pool (et écouteur de métriques) communes aux clients synchrone et asynchrone."""
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": 5000, # Pour ne pas attendre indéfiniment
+        "event_listeners": [MongoCommandMetrics()],
+    }
+
+
 # --- Gestionnaire de Connexion (Singleton simple) ---
 class DBMongo:
     client: MongoClient = None
     db: Database = None
+    async_client: AsyncIOMotorClient = None
+    async_db: AsyncIOMotorDatabase = None
 
 db_handler = DBMongo()
 
@@ -35,8 +66,7 @@ def connect_to_mongo():
     print("   🔧 Tentative de connexion à MongoDB...")
     try:
         # Créer le client MongoClient (synchrone)
-        # serverSelectionTimeoutMS=5000 pour ne pas attendre indéfiniment
-        db_handler.client = MongoClient(MONGO_DETAILS, serverSelectionTimeoutMS=5000)
+        db_handler.client = MongoClient(MONGO_DETAILS, **pool_options())
         # La ligne suivante force la connexion/vérification
         db_handler.client.admin.command('ping') # Utiliser ping, plus standard
         print(f"   ✅ Connexion MongoDB établie avec succès (Base: {DATABASE_NAME}).")
@@ -45,11 +75,18 @@ def connect_to_mongo():
         db_handler.db = db_handler.client[DATABASE_NAME]
         print(f"   ✅ Base de données '{DATABASE_NAME}' sélectionnée.")
 
+        # Client asynchrone (Motor) : les connexions s'ouvrent à la première requête
+        db_handler.async_client = AsyncIOMotorClient(MONGO_DETAILS, **pool_options())
+        db_handler.async_db = db_handler.async_client[DATABASE_NAME]
+        print(f"   ✅ Client MongoDB asynchrone prêt (pool max: {MONGO_MAX_POOL_SIZE}).")
+
     except Exception as e:
         print(f"   ❌ ERREUR CRITIQUE: Impossible de se connecter ou d'accéder à la base de données MongoDB '{DATABASE_NAME}': {e}")
         print("   ‼️ L'application ne peut pas fonctionner sans base de données. Arrêt.")
         db_handler.client = None # S'assurer que le client est bien None en cas d'échec
         db_handler.db = None     # S'assurer que db est bien None
+        db_handler.async_client = None
+        db_handler.async_db = None
         traceback.print_exc() # Afficher la trace complète pour le débogage
         sys.exit(1) # <-- Correction: QUITTER l'application si la connexion échoue
 
@@ -60,9 +97,27 @@ def close_mongo_connection():
         print("   🔌 Fermeture de la connexion MongoDB...")
         db_handler.client.close()
         print("   ✅ Connexion MongoDB fermée.")
+    if db_handler.async_client:
+        db_handler.async_client.close()
     # Reset global pour éviter une utilisation après fermeture si jamais nécessaire
     db_handler.client = None
     db_handler.db = None
+    db_handler.async_client = None
+    db_handler.async_db = None
+
+
+# --- Index (appelé au démarrage) ---
+async def ensure_indexes(indexes: dict[str, list[IndexModel]]):
+    """
+    Crée les index déclarés par les modules propriétaires des collections
+    ({collection: [IndexModel, ...]}). Un échec est signalé mais n'empêche pas le démarrage.
+    """
+    for collection_name, models in indexes.items():
+        try:
+            await get_async_db()[collection_name].create_indexes(models)
+            print(f"   ✅ Index MongoDB prêts pour '{collection_name}'.")
+        except Exception as e:
+            print(f"   ⚠️ Impossible de créer les index de '{collection_name}': {e}")
 
 
 # --- Dépendance FastAPI pour obtenir l'objet DB ---
@@ -79,6 +134,73 @@ def get_db() -> Database:
         raise RuntimeError("La connexion à la base de données n'est pas disponible.")
     return db_handler.db
 
+
+def get_async_db() -> AsyncIOMotorDatabase:
+    """
+    Dépendance FastAPI (Asynchrone): Retourne la base Motor initialisée au démarrage.
+    À utiliser dans les routes `async def` : les requêtes ne bloquent pas l'event loop
+    et ne passent pas par un thread (voir analysis_history.latest_summary / trend).
+    get_db() reste disponible le temps de migrer les routeurs.
+    """
+    if db_handler.async_db is None:
+        raise RuntimeError("La connexion asynchrone à la base de données n'est pas disponible.")
+    return db_handler.async_db
+
+
+# --- Helpers asynchrones : écritures en masse et listes paginées ---
+async def bulk_insert(collection_name: str, documents: list[dict]) -> list:
+    """Insère les documents par paquets de BULK_CHUNK_SIZE (non ordonné). Retourne les _id insérés."""
+    collection = get_async_db()[collection_name]
+    inserted_ids = []
+    for start in range(0, len(documents), BULK_CHUNK_SIZE):
+        result = await collection.insert_many(documents[start:start + BULK_CHUNK_SIZE], ordered=False)
+        inserted_ids.extend(result.inserted_ids)
+    return inserted_ids
+
+
+async def bulk_update(collection_name: str, updates: list[tuple[dict, dict]], upsert: bool = False) -> dict:
+    """
+    Applique une liste de (filtre, mise à jour) en bulk_write non ordonnés (un aller-retour
+    par BULK_CHUNK_SIZE opérations). Retourne les compteurs cumulés.
+    """
+    collection = get_async_db()[collection_name]
+    counts = {"matched": 0, "modified": 0, "upserted": 0}
+    for start in range(0, len(updates), BULK_CHUNK_SIZE):
+        operations = [
+            UpdateOne(query, update, upsert=upsert)
+            for query, update in updates[start:start + BULK_CHUNK_SIZE]
+        ]
+        result = await collection.bulk_write(operations, ordered=False)
+        counts["matched"] += result.matched_count
+        counts["modified"] += result.modified_count
+        counts["upserted"] += result.upserted_count
+    return counts
+
+
+async def find_page(collection_name: str,
+                    query: dict | None = None,
+                    projection: dict | list | None = None,
+                    limit: int = DEFAULT_PAGE_SIZE,
+                    after: str | None = None) -> tuple[list[dict], str | None]:
+    """
+    Liste paginée par curseur sur _id (pas de skip : coût constant quelle que soit la page).
+    `projection` limite les champs renvoyés ; `after` est le curseur renvoyé par la page précédente.
+    Retourne (documents, curseur suivant ou None). Lève ValueError si le curseur est invalide.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    conditions = [query] if query else []
+    if after:
+        conditions.append({"_id": {"$gt": str_to_objectid(after)}})
+    filter_ = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
+
+    cursor = get_async_db()[collection_name].find(filter_, projection).sort("_id", ASCENDING).limit(limit + 1)
+    documents = await cursor.to_list(length=limit + 1)
+    next_cursor = None
+    if len(documents) > limit: # Un document de plus que demandé : il existe une page suivante
+        documents = documents[:limit]
+        next_cursor = objectid_to_str(documents[-1]["_id"])
+    return documents, next_cursor
+
 # --- Optionnel: Helpers pour ObjectId ---
 # Peuvent être utiles dans les routes pour valider et convertir les IDs MongoDB
 from bson import ObjectId
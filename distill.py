@@ -0,0 +1,255 @@
+# distill.py - Distillation de BERT vers l'élève de la cascade (cascade.py) et rapport d'escalade
+#
+# Usage:
+#   python distill.py data-final.csv                                  # élève dans model/student
+#   python distill.py raw.csv --raw-csv --serving-preprocess 0        # API servie sans prétraitement
+#   python distill.py data-final.csv --tiny --limit 500 --epochs 2    # professeur BERT aléatoire, tests CPU
+#
+# L'élève doit apprendre sur le texte tel qu'il sera servi :
+# - `--serving-preprocess` (défaut : SERVING_PREPROCESS) décide si le corpus d'entraînement est prétraité ;
+# - `--raw-csv` indique que le CSV n'est pas déjà prétraité (data-final.csv l'est). Un CSV brut est
+#   prétraité ici si le texte servi l'est ; un CSV déjà prétraité est refusé si le texte servi est brut.
+# L'état du corpus effectivement appris est enregistré dans student.json (corpus_preprocessed)
+# et comparé à SERVING_PREPROCESS au démarrage de l'API.
+#
+# 1. Le professeur (BERT fine-tuné, backend INFERENCE_BACKEND) score tout le corpus une seule fois ;
+#    ses probabilités (soft labels) sont mises en cache par empreinte des poids.
+# 2. L'élève (n-grammes hachés + couche linéaire) apprend ces probabilités (cross-entropie douce)
+#    sur le split d'entraînement de train.py (stratifié 80/20, random_state=42).
+# 3. Sur le split de test, pour chaque seuil de confiance : taux d'escalade vers BERT, accord de la
+#    cascade avec les labels de BERT, rappel des cas "Potential Suicide Post" de BERT et accélération
+#    estimée = t_bert / (t_élève + taux_escalade * t_bert), à partir des temps mesurés par texte.
+# Le rapport est écrit dans <output>/report.json ; choisir CASCADE_THRESHOLD d'après ce rapport.
+
+# --- Standard Libraries ---
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+# --- Third-Party Libraries ---
+import numpy as np
+import torch
+import torch.nn.functional as F
+from sklearn.model_selection import train_test_split
+
+# --- Local Application Imports ---
+from cascade import (
+    CASCADE_RISK_LABELS, CASCADE_RISK_THRESHOLD, HASH_BUCKETS, NGRAMS, STUDENT_DIR,
+    HashedLinearStudent, should_escalate
+)
+from labels import CLASS_LABELS, NUM_LABELS
+from train import load_labeled_texts
+
+DEFAULT_THRESHOLDS = "0.5,0.6,0.7,0.8,0.85,0.9,0.95,0.99"
+
+
+# --- Professeur ---
+def load_teacher(tiny: bool, model_path: str, seed: int):
+    """(modèle, tokenizer, device, empreinte des poids) du modèle complet."""
+    if tiny:
+        from tiny_bert import tiny_model, tiny_tokenizer # Petit BERT aléatoire, sans accès au hub
+        tokenizer = tiny_tokenizer()
+        return tiny_model(len(tokenizer), seed=seed).eval(), tokenizer, torch.device("cpu"), f"tiny-{seed}"
+
+    from backends import INFERENCE_BACKEND, load_backend, load_tokenizer, model_weights_path
+    from prediction_cache import file_fingerprint
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model, device = load_backend(INFERENCE_BACKEND, model_path, device)
+    fingerprint = f"{INFERENCE_BACKEND}-{file_fingerprint(model_weights_path(model_path))}"
+    return model, load_tokenizer(), device, fingerprint
+
+
+def teacher_probabilities(texts: list[str], model, tokenizer, device, fingerprint: str,
+                          cache_dir: str, preprocess: bool) -> tuple[np.ndarray, float]:
+    """
+    Probabilités du professeur (N x NUM_LABELS, entre 0 et 1) et temps moyen par texte,
+    mesuré sur le chemin de serving (InferenceEngine : tri par longueur, batchs).
+    """
+    payload = f"{fingerprint}|{preprocess}|" + "\x00".join(texts)
+    path = os.path.join(cache_dir, f"teacher-{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]}.npz")
+    if os.path.exists(path):
+        cached = np.load(path)
+        print(f"♻️ Probabilités du professeur relues depuis {path}")
+        return cached["probabilities"], float(cached["seconds_per_text"])
+
+    from inference import InferenceEngine
+    engine = InferenceEngine(model, tokenizer, device, max_wait_ms=0, max_queue_size=0)
+    engine.start()
+    try:
+        engine.predict("warm up")
+        print(f"🧑‍🏫 Scoring de {len(texts)} textes par le professeur...")
+        start_time = time.perf_counter()
+        predictions = engine.predict_many(texts)
+        seconds_per_text = (time.perf_counter() - start_time) / max(1, len(texts))
+    finally:
+        engine.stop()
+
+    # Le moteur renvoie des pourcentages arrondis à 0.01 : écart négligeable pour des soft labels
+    probabilities = np.array(
+        [[probs[label] / 100.0 for label in CLASS_LABELS] for _, probs in predictions], dtype=np.float32
+    )
+    probabilities /= np.clip(probabilities.sum(axis=1, keepdims=True), 1e-6, None)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(path, probabilities=probabilities, seconds_per_text=seconds_per_text)
+    return probabilities, seconds_per_text
+
+
+# --- Élève ---
+def train_student(texts: list[str], targets: np.ndarray, epochs: int, batch_size: int,
+                  lr: float, num_buckets: int, ngrams: int, seed: int) -> HashedLinearStudent:
+    torch.manual_seed(seed)
+    student = HashedLinearStudent(num_buckets, ngrams)
+    optimizer = torch.optim.Adam(student.parameters(), lr=lr)
+    targets = torch.from_numpy(targets)
+    generator = torch.Generator().manual_seed(seed)
+    for epoch in range(epochs):
+        student.train()
+        order = torch.randperm(len(texts), generator=generator).tolist()
+        total_loss = 0.0
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            logits = student(*student.featurize([texts[i] for i in rows]))
+            # Cross-entropie douce : l'élève imite la distribution complète du professeur
+            loss = -(targets[rows] * F.log_softmax(logits, dim=1)).sum(dim=1).mean()
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(rows)
+        print(f"📘 Époque {epoch + 1}/{epochs} - perte de distillation {total_loss / max(1, len(texts)):.4f}")
+    return student.eval()
+
+
+def time_student(student: HashedLinearStudent, texts: list[str], batch_size: int = 256) -> tuple[np.ndarray, float]:
+    """Probabilités de l'élève et temps moyen par texte (featurisation comprise)."""
+    student.predict_proba(texts[:batch_size]) # Préchauffage
+    start_time = time.perf_counter()
+    chunks = [student.predict_proba(texts[i:i + batch_size]).numpy() for i in range(0, len(texts), batch_size)]
+    seconds_per_text = (time.perf_counter() - start_time) / max(1, len(texts))
+    return np.concatenate(chunks) if chunks else np.zeros((0, NUM_LABELS), dtype=np.float32), seconds_per_text
+
+
+# --- Rapport ---
+def cascade_report(student_probs: np.ndarray, teacher_probs: np.ndarray, gold: np.ndarray,
+                   thresholds: list[float], risk_threshold: float, risk_labels: list[str],
+                   t_student: float, t_teacher: float) -> list[dict]:
+    """Une ligne par seuil : escalade, accord avec BERT, rappel du risque, accélération estimée."""
+    teacher_labels = teacher_probs.argmax(axis=1)
+    student_labels = student_probs.argmax(axis=1)
+    risk_index = [CLASS_LABELS.index(label) for label in risk_labels]
+    teacher_risk = np.isin(teacher_labels, risk_index)
+    rows = []
+    for threshold in thresholds:
+        escalate = np.array([
+            should_escalate(probs, threshold, risk_threshold, risk_labels) for probs in student_probs.tolist()
+        ], dtype=bool)
+        cascade_labels = np.where(escalate, teacher_labels, student_labels)
+        escalation_rate = float(escalate.mean()) if len(escalate) else 0.0
+        answered = ~escalate
+        rows.append({
+            "threshold": threshold,
+            "escalation_rate": round(escalation_rate, 4),
+            "agreement_with_bert": round(float((cascade_labels == teacher_labels).mean()), 4),
+            # Accord de l'élève sur les seuls textes auxquels il répond (les autres sont identiques à BERT)
+            "student_agreement_when_answering": (
+                round(float((student_labels[answered] == teacher_labels[answered]).mean()), 4) if answered.any() else None
+            ),
+            "accuracy": round(float((cascade_labels == gold).mean()), 4),
+            "bert_accuracy": round(float((teacher_labels == gold).mean()), 4),
+            "risk_recall_vs_bert": (
+                round(float((cascade_labels[teacher_risk] == teacher_labels[teacher_risk]).mean()), 4)
+                if teacher_risk.any() else None
+            ),
+            "speedup": round(t_teacher / (t_student + escalation_rate * t_teacher), 2) if t_teacher else None,
+        })
+    return rows
+
+
+def distill(args):
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if not args.raw_csv and not args.serving_preprocess:
+        print(f"❌ {args.csv_path} est déjà prétraité mais le texte servi ne l'est pas (--serving-preprocess 0) :")
+        print("   l'élève apprendrait sur un autre texte que celui qu'il recevra. Fournissez un CSV brut avec --raw-csv.")
+        sys.exit(1)
+    corpus_preprocessed = args.serving_preprocess
+    texts, gold = load_labeled_texts(args.csv_path, args.raw_csv and corpus_preprocessed, args.limit)
+    rows = np.arange(len(gold))
+    train_rows, test_rows = train_test_split(
+        rows, test_size=args.test_size, random_state=42, stratify=gold # Même split que train.py
+    )
+
+    model, tokenizer, device, fingerprint = load_teacher(args.tiny, args.model_path, args.seed)
+    # Le prétraitement est déjà appliqué par load_labeled_texts : le moteur reçoit les textes tels quels
+    teacher_probs, t_teacher = teacher_probabilities(texts, model, tokenizer, device, fingerprint,
+                                                     args.cache_dir, corpus_preprocessed)
+    del model
+
+    student = train_student([texts[i] for i in train_rows], teacher_probs[train_rows], args.epochs,
+                            args.batch_size, args.lr, args.buckets, args.ngrams, args.seed)
+    student_probs, t_student = time_student(student, [texts[i] for i in test_rows])
+
+    thresholds = [float(t) for t in args.thresholds.split(",") if t.strip()]
+    report = cascade_report(student_probs, teacher_probs[test_rows], gold[test_rows], thresholds,
+                            args.risk_threshold, CASCADE_RISK_LABELS, t_student, t_teacher)
+
+    print(f"\n⏱️ BERT: {t_teacher * 1000:.3f} ms/texte | élève: {t_student * 1000:.4f} ms/texte "
+          f"| test: {len(test_rows)} textes | risque: {', '.join(CASCADE_RISK_LABELS)} >= {args.risk_threshold}")
+    print(f"{'seuil':>6} {'escalade':>9} {'accord BERT':>12} {'exactitude':>11} {'rappel risque':>14} {'accél.':>7}")
+    for row in report:
+        recall = row["risk_recall_vs_bert"]
+        print(f"{row['threshold']:>6} {row['escalation_rate']:>9.1%} {row['agreement_with_bert']:>12.1%} "
+              f"{row['accuracy']:>11.1%} {'-' if recall is None else f'{recall:.1%}':>14} {row['speedup'] or 0:>6.1f}x")
+
+    metadata = {
+        "corpus_preprocessed": corpus_preprocessed, # Texte sur lequel l'élève a appris (vérifié par l'API)
+        "raw_csv": args.raw_csv,
+        "teacher": fingerprint,
+        "risk_labels": CASCADE_RISK_LABELS,
+        "risk_threshold": args.risk_threshold,
+        "seconds_per_text": {"bert": t_teacher, "student": t_student},
+    }
+    if corpus_preprocessed:
+        from preprocessing import PREPROCESSING_VERSION
+        metadata["preprocessing_version"] = PREPROCESSING_VERSION
+    student.save(args.output, metadata)
+    report_path = os.path.join(args.output, "report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"args": vars(args), **metadata, "test_size": len(test_rows), "thresholds": report},
+                  f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Élève enregistré dans {args.output} (rapport: {report_path}).")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distille BERT vers l'élève linéaire de la cascade.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--output", default=STUDENT_DIR)
+    parser.add_argument("--model-path", default=os.getenv("MODEL_PATH", "model/bert_mental_health_model.bin"))
+    parser.add_argument("--cache-dir", default=".teacher_cache", help="Cache des probabilités du professeur")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=0.05)
+    parser.add_argument("--buckets", type=int, default=HASH_BUCKETS, help="Taille de la table de n-grammes hachés")
+    parser.add_argument("--ngrams", type=int, default=NGRAMS)
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="Seuils de confiance évalués dans le rapport")
+    parser.add_argument("--risk-threshold", type=float, default=CASCADE_RISK_THRESHOLD)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--limit", type=int, default=0, help="Ne lire que les N premières lignes (0 = tout)")
+    parser.add_argument("--raw-csv", action="store_true",
+                        help="Le CSV n'est pas prétraité (data-final.csv l'est déjà)")
+    parser.add_argument("--serving-preprocess", type=int, choices=(0, 1),
+                        default=int(os.getenv("SERVING_PREPROCESS", "1")),
+                        help="Le texte servi est-il prétraité (SERVING_PREPROCESS de l'API) ? L'élève apprend sur ce texte")
+    parser.add_argument("--tiny", action="store_true", help="Professeur BERT aléatoire et tokenizer local (tests CPU)")
+    parser.add_argument("--threads", type=int, default=0, help="torch.set_num_threads (0 = défaut)")
+    args = parser.parse_args()
+    args.serving_preprocess = bool(args.serving_preprocess)
+    distill(args)
+
+
+if __name__ == "__main__":
+    main()
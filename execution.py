@@ -0,0 +1,127 @@
+# execution.py - Modèle d'exécution hors event loop (I/O Twitter et inférence BERT)
+
+# --- Standard Libraries ---
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Third-Party Libraries ---
+from fastapi import HTTPException
+
+# --- Local Application Imports ---
+from labels import EngineOverloadedError
+
+# --- Configuration ---
+TWITTER_MAX_WORKERS = int(os.getenv("TWITTER_MAX_WORKERS", "8"))          # Threads dédiés aux appels Twitter
+TWITTER_MAX_PENDING = int(os.getenv("TWITTER_MAX_PENDING", "32"))         # Appels Twitter max en cours + en attente
+TWITTER_TIMEOUT_S = float(os.getenv("TWITTER_TIMEOUT_S", "30"))           # Timeout d'un appel Twitter (s)
+INFERENCE_TIMEOUT_S = float(os.getenv("INFERENCE_TIMEOUT_S", "60"))       # Timeout des prédictions d'une requête (s)
+OVERLOAD_RETRY_AFTER_S = int(os.getenv("OVERLOAD_RETRY_AFTER_S", "5"))    # En-tête Retry-After des réponses 429/503
+
+
+class IOExecutor:
+    """
+    Pool de threads borné pour les appels réseau bloquants (tweepy).
+
+    Avec `wait_on_rate_limit=True`, tweepy peut dormir plusieurs minutes : ces appels
+    ne doivent jamais tourner sur l'event loop. Au-delà de `max_pending` appels en cours,
+    les nouvelles requêtes sont refusées (503) plutôt que mises en file indéfiniment.
+    """
+
+    def __init__(self, max_workers: int = TWITTER_MAX_WORKERS,
+                 max_pending: int = TWITTER_MAX_PENDING,
+                 thread_name_prefix: str = "twitter-io"):
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._thread_name_prefix = thread_name_prefix
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=self._thread_name_prefix
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            # Ne pas attendre les appels endormis sur un rate limit
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, func, *args, timeout: float = TWITTER_TIMEOUT_S, **kwargs):
+        """
+        Exécute `func(*args, **kwargs)` dans le pool, avec admission control et timeout.
+        Les HTTPException levées par `func` sont propagées telles quelles.
+        """
+        if self._pending >= self.max_pending:
+            raise HTTPException(
+                status_code=503,
+                detail="Service Twitter saturé, veuillez réessayer plus tard.",
+                headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_S)}
+            )
+
+        self.start()
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        # Le compteur n'est libéré qu'à la fin réelle de l'appel : un appel abandonné
+        # sur timeout mais encore endormi dans tweepy continue d'occuper un thread.
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Délai dépassé lors de l'appel à l'API Twitter.")
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+
+async def run_inference(engine, texts: list[str], cache=None, timeout: float = INFERENCE_TIMEOUT_S) -> list:
+    """
+    Soumet les textes au moteur d'inférence (qui tourne sur son propre thread) et attend
+    les résultats sans bloquer l'event loop. Si un `cache` est fourni, seuls les textes
+    absents du cache passent par le modèle. `engine` est un InferenceEngine ou un CascadeEngine ;
+    chaque résultat est (label, probabilités, modèle ayant répondu).
+    - 429 si la file d'inférence est pleine (admission control)
+    - 504 si les prédictions ne sont pas prêtes avant `timeout`
+    """
+    try:
+        return await asyncio.wait_for(_predict_with_cache(engine, texts, cache), timeout=timeout)
+    except EngineOverloadedError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Trop de requêtes d'analyse en cours: {e}",
+            headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_S)}
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Délai dépassé lors de l'analyse des tweets.")
+
+
+async def _predict_with_cache(engine, texts: list[str], cache) -> list:
+    if cache is None:
+        return await engine.classify_many_async(texts)
+
+    # Les lectures/écritures MongoDB du cache sont bloquantes : hors event loop
+    results = await asyncio.to_thread(cache.get_many, texts)
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        predictions = await engine.classify_many_async(missing_texts)
+        for i, prediction in zip(missing, predictions):
+            results[i] = prediction
+        await asyncio.to_thread(cache.put_many, missing_texts, predictions)
+    return results
+
+
+# Instance partagée par l'application
+twitter_executor = IOExecutor()
@@ -0,0 +1,80 @@
+# export_model.py - Produit les artefacts optimisés (INT8, ONNX) à partir du .bin de MODEL_PATH
+#
+# Usage:
+#   python export_model.py --backend artifact   # config + tokenizer + safetensors (démarrage rapide, hors ligne)
+#   python export_model.py --backend int8
+#   python export_model.py --backend onnx
+#   python export_model.py --backend all --validate data-final.csv --sample 1000
+#
+# Chaque artefact est validé contre le modèle fp32 (accord des labels, écart max de
+# probabilité). Code de sortie 1 si un artefact échoue à la porte de validation.
+
+# --- Standard Libraries ---
+import argparse
+import json
+import os
+import sys
+
+# --- Third-Party Libraries ---
+import torch
+from dotenv import load_dotenv
+from transformers import BertTokenizerFast
+
+# --- Local Application Imports ---
+import backends
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export des backends d'inférence optimisés.")
+    parser.add_argument("--backend", choices=["artifact", "int8", "onnx", "all"], default="all")
+    parser.add_argument("--model-path", default=os.getenv("MODEL_PATH", "model/bert_mental_health_model.bin"))
+    parser.add_argument("--artifact-dir", default=backends.MODEL_ARTIFACT_DIR)
+    parser.add_argument("--int8-path", default=backends.INT8_MODEL_PATH)
+    parser.add_argument("--onnx-path", default=backends.ONNX_MODEL_PATH)
+    parser.add_argument("--validate", default=backends.GATE_DATA_PATH, help="CSV labellisé pour la porte de validation")
+    parser.add_argument("--sample", type=int, default=1000, help="Lignes utilisées pour la validation (0 = toutes)")
+    args = parser.parse_args()
+
+    cpu = torch.device("cpu")
+    selected = ["artifact", "int8", "onnx"] if args.backend == "all" else [args.backend]
+
+    if "artifact" in selected:
+        print(f"📦 Conversion de {args.model_path} en artefact autonome -> {args.artifact_dir}")
+        backends.export_artifact(args.model_path, args.artifact_dir)
+        print("✅ Artefact écrit (config.json, tokenizer, model.safetensors).")
+        selected.remove("artifact")
+        if not selected:
+            return
+
+    print(f"🧠 Chargement du modèle fp32 depuis {args.model_path}...")
+    tokenizer = BertTokenizerFast.from_pretrained("bert-base-uncased")
+    reference = backends.load_fp32_model(args.model_path, cpu, artifact_dir=args.artifact_dir)
+
+    failures = 0
+    for name in selected:
+        if name == "int8":
+            print(f"⚙️ Quantification dynamique INT8 -> {args.int8_path}")
+            candidate = backends.quantize_int8(reference) # quantize_dynamic travaille sur une copie
+            os.makedirs(os.path.dirname(args.int8_path) or ".", exist_ok=True)
+            torch.save(candidate.state_dict(), args.int8_path)
+        else:
+            print(f"⚙️ Export ONNX -> {args.onnx_path}")
+            os.makedirs(os.path.dirname(args.onnx_path) or ".", exist_ok=True)
+            backends.export_onnx(reference, tokenizer, args.onnx_path)
+            candidate = backends.OnnxSequenceClassifier(args.onnx_path)
+
+        report = backends.validate_backend(candidate, cpu, reference, cpu, tokenizer,
+                                           csv_path=args.validate, sample=args.sample)
+        print(f"📋 [{name}] {json.dumps(report, ensure_ascii=False)}")
+        if not report["passed"]:
+            print(f"❌ Le backend '{name}' échoue à la porte de validation.")
+            failures += 1
+        else:
+            print(f"✅ Backend '{name}' validé.")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# inference.py - Moteur d'inférence BERT avec micro-batching dynamique
+
+# --- Standard Libraries ---
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# --- Third-Party Libraries ---
+import torch
+import torch.nn.functional as F
+
+# --- Local Application Imports ---
+# Les labels vivent dans labels.py (importable sans torch) et sont ré-exportés ici
+from labels import (
+    CLASS_LABELS, NUM_LABELS, INVALID_INPUT_LABEL, PREDICTION_ERROR_LABEL,
+    EngineOverloadedError, FULL_MODEL, empty_probabilities
+)
+from metrics import BATCH_SIZE, FORWARD_SECONDS, TOKENIZATION_SECONDS, timed
+
+# --- Configuration du batching ---
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "32"))   # Nombre max de textes par forward pass
+MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))       # Attente max pour remplir un batch (ms)
+MAX_QUEUE_SIZE = int(os.getenv("INFERENCE_MAX_QUEUE", "2000"))      # Textes max en attente (admission control)
+MAX_LENGTH = 512                                                    # Longueur max en tokens (limite BERT)
+# Bornes des buckets de longueur (en tokens) : un forward pass par bucket non vide
+LENGTH_BUCKETS = [int(b) for b in os.getenv("INFERENCE_LENGTH_BUCKETS", "32,64,128,256,512").split(",")]
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingItem:
+    """Un texte en attente dans la file, avec le Future de son appelant."""
+    __slots__ = ("text", "future")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.future: Future = Future()
+
+
+class InferenceEngine:
+    """
+    Regroupe les textes soumis (par une même requête ou par des requêtes concurrentes)
+    en batchs, puis exécute les forward pass BERT par bucket de longueur.
+
+    Un thread de fond consomme la file : dès qu'un texte arrive, il attend au plus
+    `max_wait_ms` (ou jusqu'à `max_batch_size` textes) avant de lancer le batch.
+    Chaque appelant récupère son propre (label, probabilités) via un Future.
+    """
+
+    def __init__(self, model, tokenizer, device,
+                 max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS,
+                 max_queue_size: int = MAX_QUEUE_SIZE,
+                 max_length: int = MAX_LENGTH,
+                 preprocess=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue_size = max_queue_size
+        self.max_length = max_length
+        self.preprocess = preprocess # Prétraitement d'entraînement (preprocessing.preprocess_text) ou None
+
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    # --- Cycle de vie ---
+    def start(self):
+        """Démarre le thread de batching (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="bert-batcher", daemon=True)
+            self._thread.start()
+        logger.info("Moteur d'inférence démarré", extra={
+            "max_batch_size": self.max_batch_size, "max_wait_ms": self.max_wait * 1000
+        })
+
+    def stop(self, timeout: float = 5.0):
+        """Arrête le thread de batching après avoir traité les textes déjà en file."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stopping = True
+            self._queue.put(None) # Sentinelle de réveil
+        thread.join(timeout=timeout)
+        self._thread = None
+        logger.info("Moteur d'inférence arrêté")
+
+    @property
+    def queue_depth(self) -> int:
+        """Nombre de textes en attente d'un forward pass."""
+        return self._queue.qsize()
+
+    # --- API publique ---
+    def submit(self, text: str) -> Future:
+        """Soumet un texte et retourne un Future résolu en (label, probabilités)."""
+        if not text or not isinstance(text, str):
+            future: Future = Future()
+            future.set_result((INVALID_INPUT_LABEL, empty_probabilities()))
+            return future
+
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+
+        item = _PendingItem(text)
+        self._queue.put(item)
+        return item.future
+
+    def predict(self, text: str):
+        """Version bloquante : prédit l'état mental d'un seul texte."""
+        return self.submit(text).result()
+
+    def submit_many(self, texts: list[str]) -> list[Future]:
+        """
+        Soumet un lot de textes en bloc. Le lot entier est refusé (EngineOverloadedError)
+        s'il ferait dépasser max_queue_size : on ne commence pas un travail qu'on ne peut pas finir.
+        """
+        if self.max_queue_size > 0 and self.queue_depth + len(texts) > self.max_queue_size:
+            raise EngineOverloadedError(
+                f"File d'inférence pleine ({self.queue_depth}/{self.max_queue_size} textes en attente)."
+            )
+        return [self.submit(text) for text in texts]
+
+    def predict_many(self, texts: list[str]) -> list:
+        """Version bloquante : prédit une liste de textes (ordre conservé)."""
+        futures = self.submit_many(texts)
+        return [future.result() for future in futures]
+
+    async def predict_many_async(self, texts: list[str]) -> list:
+        """
+        Version asynchrone : attend les prédictions sans bloquer l'event loop.
+        Si l'attente est annulée (timeout), les textes pas encore traités sont retirés des batchs.
+        """
+        futures = [asyncio.wrap_future(future) for future in self.submit_many(texts)]
+        return list(await asyncio.gather(*futures))
+
+    # --- Interface commune avec CascadeEngine : (label, probabilités, modèle ayant répondu) ---
+    def classify_many(self, texts: list[str]) -> list:
+        return [(label, probabilities, FULL_MODEL) for label, probabilities in self.predict_many(texts)]
+
+    async def classify_many_async(self, texts: list[str]) -> list:
+        return [(label, probabilities, FULL_MODEL) for label, probabilities in await self.predict_many_async(texts)]
+
+    # --- Boucle de batching ---
+    def _collect_batch(self, first: _PendingItem) -> list[_PendingItem]:
+        """Complète un batch jusqu'à max_batch_size ou jusqu'à l'échéance max_wait."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None: # Arrêt demandé : on traite ce qu'on a déjà
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                if self._stopping:
+                    if self._queue.empty():
+                        return
+                    self._queue.put(None) # Vider la file d'abord, puis s'arrêter
+                continue
+            batch = self._collect_batch(first)
+            self._process_batch(batch)
+
+    def _process_batch(self, batch: list[_PendingItem]):
+        """Exécute un forward pass sur le batch et résout chaque Future."""
+        # Ignorer les textes dont l'appelant a abandonné (timeout / annulation)
+        batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [item.text for item in batch]
+        BATCH_SIZE.observe(len(texts))
+        try:
+            results = self._forward(texts)
+        except Exception:
+            logger.exception("Erreur pendant la prédiction BERT", extra={"batch_size": len(texts)})
+            results = [(PREDICTION_ERROR_LABEL, empty_probabilities()) for _ in texts]
+
+        for item, result in zip(batch, results):
+            item.future.set_result(result)
+
+    def _forward(self, texts: list[str]) -> list:
+        """
+        Tokenise tout le batch en un seul appel (tokenizer rapide), puis exécute un
+        forward pass par bucket de longueur : chaque bucket n'est paddé qu'à la longueur
+        de son plus long texte, au lieu de l'être au plus long texte du batch.
+        Les résultats sont retournés dans l'ordre des textes d'entrée.
+        """
+        with timed(TOKENIZATION_SECONDS):
+            if self.preprocess is not None:
+                texts = [self.preprocess(text) for text in texts]
+            encodings = self.tokenizer(
+                texts,
+                padding=False,
+                truncation=True,
+                max_length=self.max_length
+            )
+
+        results = [None] * len(texts)
+        for bucket in bucket_by_length(encodings["input_ids"], LENGTH_BUCKETS):
+            features = [{key: encodings[key][i] for key in encodings.keys()} for i in bucket]
+            inputs = self.tokenizer.pad(features, padding=True, return_tensors="pt").to(self.device)
+            with timed(FORWARD_SECONDS):
+                predictions = self._predict_tensors(inputs)
+            for i, result in zip(bucket, predictions):
+                results[i] = result
+        return results
+
+    def _predict_tensors(self, inputs) -> list:
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+
+        probabilities = F.softmax(outputs.logits, dim=1).cpu()
+        predicted_indices = torch.argmax(probabilities, dim=1).tolist()
+
+        results = []
+        for row, predicted_index in zip(probabilities.tolist(), predicted_indices):
+            probabilities_dict = {
+                CLASS_LABELS[i]: round(row[i] * 100, 2)
+                for i in range(len(CLASS_LABELS))
+            }
+            results.append((CLASS_LABELS[predicted_index], probabilities_dict))
+        return results
+
+
+def bucket_by_length(sequences: list, boundaries: list[int]) -> list[list[int]]:
+    """
+    Trie les séquences par longueur et les regroupe par bucket : une séquence de
+    longueur L va dans le premier bucket dont la borne est >= L.
+    Retourne des listes d'indices (dans l'ordre croissant de longueur).
+    """
+    order = sorted(range(len(sequences)), key=lambda i: len(sequences[i]))
+    buckets: list[list[int]] = []
+    current: list[int] = []
+    current_bound = None
+    for i in order:
+        length = len(sequences[i])
+        bound = next((b for b in boundaries if length <= b), boundaries[-1])
+        if current and bound != current_bound:
+            buckets.append(current)
+            current = []
+        current.append(i)
+        current_bound = bound
+    if current:
+        buckets.append(current)
+    return buckets
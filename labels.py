@@ -0,0 +1,23 @@
+# labels.py - Labels du modèle (module léger, sans dépendance torch/transformers)
+
+# !! L'ordre doit correspondre exactement à celui utilisé pendant l'entraînement !!
+CLASS_LABELS = ["Normal", "Stressed", "Anxiety", "Depression", "Potential Suicide Post"] # Les 5 labels corrects
+NUM_LABELS = len(CLASS_LABELS)
+
+# Labels "sentinelles" retournés quand aucune prédiction n'a pu être faite
+INVALID_INPUT_LABEL = "Invalid Input"
+PREDICTION_ERROR_LABEL = "Prediction Error"
+
+
+def empty_probabilities() -> dict[str, float]:
+    """Retourne un dictionnaire de probabilités à zéro pour tous les labels."""
+    return {label: 0.0 for label in CLASS_LABELS}
+
+
+class EngineOverloadedError(Exception):
+    """Levée quand la file d'inférence est pleine et qu'un nouveau lot est refusé."""
+
+
+# Modèle ayant produit une prédiction (champ `answered_by` des réponses, voir cascade.py)
+FULL_MODEL = "bert"
+STUDENT_MODEL = "student"
@@ -1,227 +1,287 @@
-# main.py - Version Corrigée avec événements FastAPI
+# main.py - Version Corrigée avec lifespan FastAPI (chargement du modèle en arrière-plan)
 
 # --- Standard Libraries ---
+import asyncio
+import json
+import logging
 import os
 import time
-import traceback # Pour un meilleur débogage
+import signal
 import sys # Pour utiliser sys.exit() si nécessaire (bien que database.py le fasse déjà)
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Literal, Optional
 
 # --- Third-Party Libraries ---
-import torch
-import torch.nn.functional as F
-from fastapi import FastAPI, HTTPException # Importer ici une seule fois
+# torch / transformers ne sont PAS importés ici : ils sont chargés en arrière-plan
+# par load_ai_resources() pour que l'API (CRUD, santé) réponde dès le démarrage.
+from fastapi import FastAPI, HTTPException, Query, Request # Importer ici une seule fois
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.routing import Match
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from transformers import BertTokenizer, BertForSequenceClassification
 import tweepy
-import pandas as pd
 from dotenv import load_dotenv
 
 # --- Local Application Imports ---
 import database  # Importe le module database pour accéder à ses fonctions
+import memory_stats
+import metrics
+import profiling
+from log_config import setup_logging
+from labels import CLASS_LABELS, FULL_MODEL, INVALID_INPUT_LABEL, PREDICTION_ERROR_LABEL, empty_probabilities
+from execution import twitter_executor, run_inference
+import analysis_history
+import response_encoding
+from twitter_ingestion import INDEXES as twitter_ingestion_indexes, MAX_TWEETS_PER_USER, TwitterIngestion
 from routers import doctors, patients # Importe le routeur depuis le dossier routers
 
 # --- Configuration & Initialisation (exécuté une seule fois au démarrage du script) ---
-print("🚀 Démarrage du script principal de l'API...")
+# Logs structurés écrits par un thread dédié : aucun appel de log ne bloque l'event loop
+setup_logging()
+logger = logging.getLogger("main")
+logger.info("Démarrage du script principal de l'API")
 load_dotenv() # Charge les variables depuis .env
 
 # --- Configuration IA & Twitter ---
 MODEL_PATH = os.getenv("MODEL_PATH", "model/bert_mental_health_model.bin") # Utiliser getenv avec défaut
 BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")
+MODEL_READY_RETRY_AFTER_S = 10 # En-tête Retry-After tant que le modèle se charge
+# Applique aux tweets le même prétraitement qu'à l'entraînement (preprocessing.py)
+SERVING_PREPROCESS = os.getenv("SERVING_PREPROCESS", "1") == "1"
+# Cascade : un élève distillé (distill.py) répond aux textes évidents, BERT aux cas ambigus ou à risque
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "0") == "1"
 
 if not BEARER_TOKEN:
-    print("❌ ERREUR CRITIQUE: TWITTER_BEARER_TOKEN non trouvé dans les variables d'environnement.")
+    logger.critical("TWITTER_BEARER_TOKEN non trouvé dans les variables d'environnement")
+    logging.shutdown()
     sys.exit(1) # Utiliser sys.exit(1) ici aussi pour cohérence
 
-print("🐦 Initialisation du client Twitter...")
-try:
-    twitter_client = tweepy.Client(
-        bearer_token=BEARER_TOKEN,
-        wait_on_rate_limit=True,
-        # connection_timeout=10, # Optionnel: timeout de connexion
-        # request_timeout=30     # Optionnel: timeout de requête
-    )
-    # Note: Une simple initialisation ne garantit pas la connexion. Un appel test peut être utile.
-    # Ex: user_info = twitter_client.get_me()
-    # if not user_info.data:
-    #     raise Exception("Impossible de récupérer les informations de l'utilisateur Twitter (Bearer Token invalide ?)")
-    print("✅ Client Twitter initialisé.")
-except tweepy.errors.TweepyException as e:
-     print(f"❌ ERREUR CRITIQUE: Échec de l'initialisation du client Twitter: {e}")
-     sys.exit(1) # Quitter en cas d'échec critique
-except Exception as e:
-    print(f"❌ ERREUR CRITIQUE: Erreur inattendue lors de l'initialisation de Twitter: {e}")
-    sys.exit(1) # Quitter en cas d'échec critique
-
-
-print("🧠 Chargement du tokenizer et du modèle BERT...")
-try:
-    tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
-    # Assurez-vous que NUM_LABELS est défini AVANT de charger le modèle
-    # !! Assurez-vous que CLASS_LABELS est défini et correct pour votre modèle !!
-    CLASS_LABELS = ["Normal", "Stressed", "Anxiety", "Depression", "Potential Suicide Post"] # Les 5 labels corrects
-    NUM_LABELS = len(CLASS_LABELS)
-
-    model = BertForSequenceClassification.from_pretrained("bert-base-uncased", num_labels=NUM_LABELS)
-    
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Utilisation du device: {device}")
-
-    if not os.path.exists(MODEL_PATH):
-         print(f"❌ ERREUR CRITIQUE: Fichier modèle non trouvé à l'emplacement: {MODEL_PATH}")
-         sys.exit(1)
-
-    # Charger les poids du modèle avec map_location
-    model.load_state_dict(torch.load(MODEL_PATH, map_location=device))
-    model.to(device) # Mettre le modèle sur le bon device
-    model.eval() # Mettre le modèle en mode évaluation (désactive dropout, etc.)
-    print("✅ Modèle BERT chargé avec succès.")
-
-except FileNotFoundError:
-     print(f"❌ ERREUR CRITIQUE: Fichier modèle non trouvé à l'emplacement: {MODEL_PATH}")
-     sys.exit(1) # Redondant avec la vérification os.path.exists, mais clair
-except Exception as e:
-    print(f"❌ ERREUR CRITIQUE: Erreur lors du chargement du modèle/tokenizer BERT: {e}")
-    traceback.print_exc()
-    sys.exit(1) # Quitter en cas d'échec critique
-
+# --- Ressources IA (initialisées dans le lifespan, pas à l'import) ---
+twitter_client = None
+tokenizer = None
+model = None
+device = None
+inference_engine = None
+cascade_engine = None             # CascadeEngine si CASCADE_ENABLED=1 (délègue à inference_engine)
+prediction_cache = None
+model_ready = threading.Event()   # Levé quand le modèle est chargé et préchauffé
+model_load_error = None           # Message d'erreur si le chargement a échoué
+
+
+def init_twitter_client():
+    """Crée le client Twitter (rapide, aucun appel réseau)."""
+    global twitter_client
+    logger.info("Initialisation du client Twitter")
+    try:
+        twitter_client = tweepy.Client(
+            bearer_token=BEARER_TOKEN,
+            wait_on_rate_limit=True,
+            # connection_timeout=10, # Optionnel: timeout de connexion
+            # request_timeout=30     # Optionnel: timeout de requête
+        )
+        # Note: Une simple initialisation ne garantit pas la connexion. Un appel test peut être utile.
+        # Ex: user_info = twitter_client.get_me()
+        logger.info("Client Twitter initialisé")
+    except tweepy.errors.TweepyException as e:
+         logger.critical("Échec de l'initialisation du client Twitter: %s", e)
+         sys.exit(1) # Quitter en cas d'échec critique
+    except Exception as e:
+        logger.critical("Erreur inattendue lors de l'initialisation de Twitter: %s", e)
+        sys.exit(1) # Quitter en cas d'échec critique
 
-# --- Définition des Fonctions d'aide (Analyse IA) ---
-# ... (Les fonctions get_user_tweets et predict_mental_state restent identiques) ...
 
-def get_user_tweets(username: str, max_results: int = 10):
-    """Récupère les tweets d'un utilisateur Twitter."""
-    print(f"\n🔍 Tentative de récupération des tweets pour @{username} (max: {max_results})....")
+def load_ai_resources():
+    """
+    Charge le tokenizer et le modèle BERT, démarre le moteur d'inférence et le préchauffe.
+    Exécutée dans un thread de fond pendant que l'API sert déjà les autres routes.
+    En cas d'échec critique, le processus est arrêté proprement (SIGTERM) : on ne sert
+    jamais /analyze sans modèle valide.
+    """
+    global tokenizer, model, device, inference_engine, cascade_engine, prediction_cache
+    start_time = time.perf_counter()
+    logger.info("Chargement du tokenizer et du modèle BERT (arrière-plan)")
     try:
-        # 1. Obtenir l'ID de l'utilisateur
-        print(f"   Obtention de l'ID utilisateur pour @{username}...")
-        user_response = twitter_client.get_user(username=username)
-        if not user_response.data:
-            print(f"   ⚠️ Utilisateur Twitter @{username} non trouvé.")
-            raise HTTPException(status_code=404, detail=f"L'utilisateur Twitter @{username} n'a pas été trouvé.")
-        user_id = user_response.data.id
-        print(f"   ID Utilisateur: {user_id}")
-
-        # 2. Récupérer les tweets
-        print(f"   Récupération des {max_results} derniers tweets...")
-        fetch_count = max(5, min(100, max_results)) # Assurer que c'est dans les limites de l'API
-
-        tweets_response = twitter_client.get_users_tweets(
-            id=user_id,
-            max_results=fetch_count,
-            tweet_fields=["created_at", "public_metrics"] # Champs nécessaires
+        # Imports lourds différés : ne ralentissent ni l'import de main.py ni les reloads
+        import torch
+        from backends import (
+            INFERENCE_BACKEND, BackendValidationError, backend_artifact_path, load_tokenizer,
+            load_validated_backend, model_weights_path
         )
+        from inference import InferenceEngine
+        from prediction_cache import PredictionCache, file_fingerprint
+        from preprocessing import PREPROCESSING_VERSION, preprocess_text
+    except ImportError as e:
+        abort_model_load(f"Dépendance IA manquante: {e}")
+        return
 
-        if not tweets_response.data:
-            print(f"   ℹ️ Aucun tweet récent trouvé pour @{username}.")
-            return [] # Retourner une liste vide est cohérent
-
-        # 3. Formater les tweets
-        formatted_tweets = []
-        for tweet in tweets_response.data:
-            likes = tweet.public_metrics.get("like_count", 0) if tweet.public_metrics else 0
-            retweets = tweet.public_metrics.get("retweet_count", 0) if tweet.public_metrics else 0
-            formatted_tweets.append({
-                "id": tweet.id,
-                "text": tweet.text,
-                "created_at": str(tweet.created_at), # Convertir en string pour JSON
-                "likes": likes,
-                "retweets": retweets
-            })
-
-        print(f"✅ Récupéré {len(formatted_tweets)} tweets pour @{username}.")
-        return formatted_tweets
-
-    except tweepy.errors.NotFound:
-         print(f"   ⚠️ Utilisateur Twitter @{username} non trouvé (Tweepy NotFound).")
-         raise HTTPException(status_code=404, detail=f"L'utilisateur Twitter @{username} n'a pas été trouvé.")
-    except tweepy.errors.TweepyException as e:
-        print(f"   ❌ Erreur API Twitter pour @{username}: {e}")
-        error_detail = f"Erreur de l'API Twitter: {e}"
-        try:
-             if hasattr(e, 'api_codes') and e.api_codes and hasattr(e, 'api_errors') and e.api_errors:
-                  error_detail = f"Erreur API Twitter {e.api_codes[0]}: {e.api_errors[0]}"
-        except Exception:
-            pass
-        raise HTTPException(status_code=503, detail=error_detail)
+    try:
+        # Tokenizer rapide (Rust) : encodage par batch, sortie identique au BertTokenizer Python
+        # (vérifiable avec: python tokenizer_parity.py data-final.csv)
+        # Depuis l'artefact local s'il existe (python export_model.py --backend artifact)
+        tokenizer = load_tokenizer()
+
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+        # Backend choisi par INFERENCE_BACKEND (pytorch | int8 | onnx).
+        # Les backends optimisés sont validés contre le modèle fp32 : refus au démarrage si la porte échoue.
+        logger.info("Backend d'inférence: %s", INFERENCE_BACKEND)
+        # Empreintes prises juste avant le chargement : ce sont elles qui indexent le cache,
+        # les tweets stockés et les agrégats pendant toute la vie du processus.
+        # INT8/ONNX passent la porte sans être identiques au fp32 : backend et artefact chargé
+        # entrent donc aussi dans l'empreinte.
+        weights_path = model_weights_path(MODEL_PATH)
+        artifact_path = backend_artifact_path(INFERENCE_BACKEND, MODEL_PATH)
+        loaded_paths = sorted({weights_path, artifact_path})
+        loaded_stats = [os.stat(path) for path in loaded_paths]
+        weights_fingerprint = file_fingerprint(weights_path)
+        backend_salt = INFERENCE_BACKEND
+        if artifact_path != weights_path:
+            backend_salt = f"{INFERENCE_BACKEND}-{file_fingerprint(artifact_path)}"
+        model, device = load_validated_backend(INFERENCE_BACKEND, MODEL_PATH, device, tokenizer)
+        for path, before in zip(loaded_paths, loaded_stats):
+            after = os.stat(path)
+            if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+                raise RuntimeError(f"Fichier de poids {path} modifié pendant le chargement, redémarrez le worker.")
+        logger.info("Utilisation du device: %s", device)
+
+        # Moteur de micro-batching : regroupe les textes de toutes les requêtes en batchs.
+        # Le prétraitement d'entraînement est appliqué dans le thread du moteur, hors event loop.
+        inference_engine = InferenceEngine(
+            model, tokenizer, device,
+            preprocess=preprocess_text if SERVING_PREPROCESS else None
+        )
+        inference_engine.start()
+        metrics.QUEUE_DEPTH.set_function(lambda: inference_engine.queue_depth) # Lu au moment du scrape
+        inference_engine.predict("warm up") # Préchauffage : premier forward pass hors requête utilisateur
+
+        salt = f"{backend_salt}-" + (f"pre{PREPROCESSING_VERSION}" if SERVING_PREPROCESS else "raw")
+        if CASCADE_ENABLED:
+            from cascade import STUDENT_DIR, CascadeEngine, HashedLinearStudent
+            student = HashedLinearStudent.load(STUDENT_DIR)
+            # L'élève reçoit le même texte que BERT (SERVING_PREPROCESS) : il doit avoir appris sur ce texte
+            corpus_preprocessed = student.metadata.get("corpus_preprocessed")
+            if corpus_preprocessed != SERVING_PREPROCESS:
+                raise ValueError(
+                    f"Élève {STUDENT_DIR} distillé sur un corpus corpus_preprocessed={corpus_preprocessed}, "
+                    f"mais SERVING_PREPROCESS={int(SERVING_PREPROCESS)} (relancez distill.py --serving-preprocess)."
+                )
+            cascade_engine = CascadeEngine(
+                student, inference_engine,
+                preprocess=preprocess_text if SERVING_PREPROCESS else None
+            )
+            # Les réponses dépendent aussi de l'élève et des seuils : ils entrent dans l'empreinte du cache
+            student_fingerprint = file_fingerprint(os.path.join(STUDENT_DIR, "student.pt"))
+            salt = f"{salt}-{cascade_engine.config_fingerprint}-{student_fingerprint}"
+            logger.info("Cascade activée", extra=cascade_engine.stats())
+
+        # Cache des prédictions (mémoire + MongoDB) indexé par l'empreinte des poids chargés ;
+        # un nouveau fichier de poids n'est pris en compte qu'au redémarrage (modèle et cache ensemble)
+        prediction_cache = PredictionCache(weights_path, salt=salt, weights_fingerprint=weights_fingerprint)
+        prediction_cache.ensure_indexes() # Index TTL du cache partagé (nécessite la connexion MongoDB)
+        metrics.CACHE_HIT_RATIO.set_function(lambda: prediction_cache.stats()["hit_ratio"])
+
+        model_ready.set()
+        logger.info("Modèle BERT chargé et préchauffé", extra={"load_s": round(time.perf_counter() - start_time, 1)})
+
+    except FileNotFoundError as e:
+        abort_model_load(f"Fichier modèle non trouvé: {e}")
+    except BackendValidationError as e:
+        abort_model_load(str(e)) # Ne jamais servir un backend non fidèle au modèle fp32
     except Exception as e:
-        print(f"   ❌ Erreur inattendue lors de la récupération des tweets pour @{username}: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail="Erreur interne inattendue lors de la récupération des tweets.")
+        logger.exception("Erreur lors du chargement du modèle")
+        abort_model_load(f"Erreur lors du chargement du modèle/tokenizer BERT: {e}")
 
 
-def predict_mental_state(text: str):
-    """Prédit l'état mental à partir d'un texte en utilisant le modèle BERT."""
-    if not text or not isinstance(text, str):
-        print("   ⚠️ Texte invalide fourni pour la prédiction.")
-        return "Invalid Input", {label: 0.0 for label in CLASS_LABELS}
+def abort_model_load(message: str):
+    """Enregistre l'erreur (exposée par /health/ready) et arrête proprement uvicorn."""
+    global model_load_error
+    model_load_error = message
+    logger.critical(message)
+    os.kill(os.getpid(), signal.SIGTERM) # sys.exit() ne quitterait que ce thread
 
-    try:
-        inputs = tokenizer(
-            text,
-            return_tensors="pt",
-            padding=True,
-            truncation=True,
-            max_length=512
-        ).to(device)
 
-        with torch.no_grad():
-            outputs = model(**inputs)
+def require_model():
+    """Lève 503 (avec Retry-After) tant que le modèle n'est pas prêt."""
+    if not model_ready.is_set():
+        raise HTTPException(
+            status_code=503,
+            detail=model_load_error or "Le modèle d'analyse est en cours de chargement, veuillez réessayer.",
+            headers={"Retry-After": str(MODEL_READY_RETRY_AFTER_S)}
+        )
 
-        logits = outputs.logits
-        probabilities = F.softmax(logits, dim=1)[0]
-        predicted_index = torch.argmax(probabilities).item()
-        predicted_label = CLASS_LABELS[predicted_index]
 
-        probabilities_dict = {
-            CLASS_LABELS[i]: round(probabilities[i].item() * 100, 2)
-            for i in range(len(CLASS_LABELS))
-        }
+# --- Définition des Fonctions d'aide (Analyse IA) ---
+# La récupération des tweets passe par twitter_ingestion.py (cache username -> id,
+# since_id, pagination, timelines stockées dans MongoDB, appels concurrents fusionnés)
+twitter_ingestion = TwitterIngestion(lambda: twitter_client, twitter_executor)
 
-        return predicted_label, probabilities_dict
 
-    except Exception as e:
-        print(f"   ❌ Erreur pendant la prédiction BERT pour le texte '{text[:50]}...': {e}")
-        traceback.print_exc()
-        return "Prediction Error", {label: 0.0 for label in CLASS_LABELS}
+def serving_engine():
+    """Moteur qui répond aux requêtes : la cascade si elle est activée, sinon BERT seul."""
+    return cascade_engine if cascade_engine is not None else inference_engine
 
 
-# --- FastAPI Application Setup ---
-app = FastAPI(
-    title="API Analyse IA & Gestion Docteurs",
-    description="Combine l'analyse IA de profils Twitter et l'inscription/gestion des docteurs.",
-    version="1.1.0"
-)
+def predict_mental_state(text: str):
+    """
+    Prédit l'état mental à partir d'un texte en utilisant le modèle BERT.
+    Le texte passe par le moteur de micro-batching (voir inference.py), ou par la cascade.
+    """
+    if not text or not isinstance(text, str):
+        logger.warning("Texte invalide fourni pour la prédiction")
+        return INVALID_INPUT_LABEL, empty_probabilities()
+
+    require_model()
+    cached = prediction_cache.get(text)
+    if cached is not None:
+        return cached[:2]
 
-# --- Handlers d'Événements de Démarrage et d'Arrêt ---
-# !! C'est l'ajout clé pour l'initialisation de la base de données !!
+    prediction = serving_engine().classify_many([text])[0]
+    prediction_cache.put(text, prediction)
+    return prediction[:2]
 
-@app.on_event("startup")
-def startup_event():
+
+# --- Cycle de vie de l'application (remplace les événements startup/shutdown) ---
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    Fonction exécutée par FastAPI au démarrage de l'application.
-    Initialise la connexion à la base de données et d'autres ressources si nécessaire.
+    Démarrage : connexion MongoDB et client Twitter (rapides), puis chargement du modèle
+    en arrière-plan. Les routes CRUD et de santé répondent immédiatement ;
+    /analyze répond 503 tant que /health/ready n'est pas OK.
+    Arrêt : libère le moteur d'inférence, le pool Twitter et la connexion MongoDB.
     """
-    print("🚀 Événement de démarrage déclenché par FastAPI.")
-    # Appelle la fonction de connexion définie dans database.py
+    logger.info("Démarrage de l'application (lifespan)")
     # Si la connexion échoue, database.connect_to_mongo() appelle sys.exit(1)
     # et l'application s'arrête.
     database.connect_to_mongo()
-    # Ici vous pourriez ajouter d'autres initialisations si besoin (ex: chargement de caches, etc.)
-    print("✅ Événement de démarrage terminé.")
+    init_twitter_client()
+    twitter_executor.start() # Pool de threads dédié aux appels Twitter bloquants
+    # Index des collections de l'API (tweets, historique des analyses), créés via Motor
+    await database.ensure_indexes({**twitter_ingestion_indexes, **analysis_history.INDEXES})
+    loader = threading.Thread(target=load_ai_resources, name="model-loader", daemon=True)
+    loader.start()
+    logger.info("Démarrage terminé (modèle en cours de chargement en arrière-plan)")
+
+    yield
+
+    logger.info("Arrêt de l'application")
+    if inference_engine is not None:
+        inference_engine.stop()
+    twitter_executor.shutdown()
+    database.close_mongo_connection()
+    logger.info("Arrêt terminé")
 
 
-@app.on_event("shutdown")
-def shutdown_event():
-    """
-    Fonction exécutée par FastAPI à l'arrêt de l'application.
-    Ferme la connexion à la base de données et libère d'autres ressources si nécessaire.
-    """
-    print("👋 Événement d'arrêt déclenché par FastAPI.")
-    # Appelle la fonction de fermeture définie dans database.py
-    database.close_mongo_connection()
-    # Ici vous pourriez ajouter d'autres nettoyages si besoin
-    print("✅ Événement d'arrêt terminé.")
+# --- FastAPI Application Setup ---
+app = FastAPI(
+    title="API Analyse IA & Gestion Docteurs",
+    description="Combine l'analyse IA de profils Twitter et l'inscription/gestion des docteurs.",
+    version="1.1.0",
+    lifespan=lifespan
+)
 
 
 # --- CORS Middleware Configuration ---
@@ -234,7 +294,7 @@ origins = [
     # Ajoutez l'URL de votre frontend déployé ici en production
 ]
 
-print(f"🔧 Configuration CORS - Origines Autorisées: {origins}")
+logger.info("Configuration CORS", extra={"origins": origins})
 
 app.add_middleware(
     CORSMiddleware,
@@ -244,20 +304,54 @@ app.add_middleware(
     allow_headers=["*"],         # Autorise tous les en-têtes (ex: Content-Type, Authorization)
 )
 
+
+def route_template(request: Request) -> str:
+    """Modèle de chemin de la route (ex: /analyses/{username}/trend) : cardinalité bornée des labels."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """
+    Latence et erreurs (codes des HTTPException compris) par route pour /metrics,
+    et profilage par échantillonnage si la requête porte `X-Profile: 1` (PROFILING_ENABLED=1).
+    """
+    profiler = profiling.start_profiler() if profiling.wants_profile(request.headers) else None
+    start = time.perf_counter()
+    status = 500 # Exception non gérée : FastAPI répondra 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = route_template(request)
+        metrics.observe_request(request.method, route, status, time.perf_counter() - start)
+        if profiler is not None:
+            profiler.stop() # Sur le thread qui a appelé start() (l'event loop), même si la route a levé
+    if profiler is not None:
+        # Seuls le rendu HTML et l'écriture du fichier partent hors event loop
+        response.headers["X-Profile-Path"] = await asyncio.to_thread(profiling.save_profile, profiler, route)
+    return response
+
 # --- Inclure les Routeurs ---
 # Ajoute toutes les routes définies dans routers/doctors.py (préfixées par /api)
-# Ces routes vont utiliser la dépendance get_db() qui s'attend à ce que db_handler.db soit initialisé
+# Ces routes utilisent get_db() (synchrone) ou, une fois migrées, get_async_db() (Motor, non bloquant)
 app.include_router(doctors.router, prefix="/api") # Ajout explicite du préfixe /api pour clarté
-print("✅ Routeur pour les docteurs (/api/...) inclus.")
+logger.info("Routeur pour les docteurs (/api/...) inclus")
 
 app.include_router(patients.router, prefix="/api") # <--- GARDEZ CETTE LIGNE
-print("✅ Routeur pour les patients (/api/patients/...) inclus.")
+logger.info("Routeur pour les patients (/api/patients/...) inclus")
 
 
 # --- Modèles Pydantic pour la route /analyze ---
 class AnalyzeRequest(BaseModel):
     username: str = Field(..., description="Nom d'utilisateur Twitter à analyser (sans le @)")
-    max_tweets: int = Field(10, gt=0, le=100, description="Nombre max de tweets à analyser (entre 1 et 100)")
+    max_tweets: int = Field(10, gt=0, le=MAX_TWEETS_PER_USER, description=f"Nombre max de tweets à analyser (entre 1 et {MAX_TWEETS_PER_USER})")
+    format: Literal["default", "compact"] = Field("default", description="'compact' : colonnes, labels listés une fois, compression négociée")
+    include_text: bool = Field(True, description="Format compact uniquement : inclure le texte des tweets")
 
 class TweetPrediction(BaseModel):
      id: int
@@ -267,6 +361,7 @@ class TweetPrediction(BaseModel):
      retweets: int
      predicted_state: str
      probabilities: dict[str, float]
+     answered_by: str = Field(FULL_MODEL, description="Modèle ayant répondu: 'bert' ou 'student' (cascade)")
 
 class AnalysisResult(BaseModel):
     username: str
@@ -274,6 +369,35 @@ class AnalysisResult(BaseModel):
     overall_summary: dict[str, float]
     predictions: list[TweetPrediction]
 
+class AnalysisSummary(BaseModel):
+    username: str
+    analyzed_at: datetime
+    tweets_analyzed: int
+    overall_summary: dict[str, float]
+    model: str
+
+class TrendPoint(BaseModel):
+    bucket: str = Field(..., description="Début du jour ou de la semaine (AAAA-MM-JJ, UTC)")
+    tweets: int
+    label_counts: dict[str, int]
+    summary: dict[str, float]
+    mean_probabilities: dict[str, float]
+
+class TrendResponse(BaseModel):
+    username: str
+    period: Literal["day", "week"]
+    model: Optional[str]
+    points: list[TrendPoint]
+
+class BatchUser(BaseModel):
+    username: str = Field(..., description="Nom d'utilisateur Twitter à analyser (sans le @)")
+    max_tweets: int = Field(10, gt=0, le=MAX_TWEETS_PER_USER, description=f"Nombre max de tweets à analyser (entre 1 et {MAX_TWEETS_PER_USER})")
+
+class BatchAnalyzeRequest(BaseModel):
+    users: list[BatchUser] = Field(..., min_length=1, max_length=500, description="Utilisateurs à analyser")
+    include_predictions: bool = Field(False, description="Diffuser aussi chaque TweetPrediction")
+    format: Optional[Literal["ndjson", "sse"]] = Field(None, description="Format du flux (par défaut selon l'en-tête Accept)")
+
 
 # --- Routes principales définies dans main.py ---
 
@@ -282,25 +406,70 @@ async def root():
     """Endpoint simple pour confirmer que l'API est en ligne et fonctionnelle."""
     return {"message": "API Analyse IA & Gestion Docteurs est en ligne"}
 
-@app.post("/analyze",
-          response_model=AnalysisResult,
-          summary="Analyser les tweets d'un utilisateur",
-          tags=["Analyse IA"])
-async def analyze_profile(request: AnalyzeRequest):
+@app.get("/health/live", summary="Sonde de vivacité", tags=["Général"])
+async def health_live():
+    """Le processus répond (n'attend pas le modèle)."""
+    return {"status": "alive"}
+
+@app.get("/health/ready", summary="Sonde de disponibilité du modèle", tags=["Général"])
+async def health_ready():
+    """200 quand le modèle est chargé et préchauffé, 503 sinon."""
+    if model_ready.is_set():
+        return {"status": "ready"}
+    status = "error" if model_load_error else "loading"
+    return JSONResponse(
+        status_code=503,
+        content={"status": status, "detail": model_load_error},
+        headers={"Retry-After": str(MODEL_READY_RETRY_AFTER_S)}
+    )
+
+@app.get("/health/memory", summary="Mémoire unique / partagée du worker", tags=["Général"])
+async def health_memory():
     """
-    Récupère les tweets d'un utilisateur Twitter, prédit l'état mental
-    pour chaque tweet et retourne un résumé global.
+    RSS, PSS, mémoire unique et partagée de ce worker, et part du fichier de poids mappé.
+    Avec MODEL_SHARED_WEIGHTS=1, les poids doivent apparaître en 'shared' dès deux workers.
     """
-    print(f"⚡ Requête reçue pour analyser @{request.username} (max_tweets: {request.max_tweets})")
-
-    user_tweets = get_user_tweets(request.username, max_results=request.max_tweets)
+    weights_path = prediction_cache.model_path if prediction_cache is not None else None
+    return await asyncio.to_thread(memory_stats.memory_report, weights_path)
+
+@app.get("/metrics", summary="Métriques Prometheus", tags=["Général"])
+async def prometheus_metrics():
+    """Histogrammes et compteurs par étape (Twitter, tokenisation, forward, cache, MongoDB, HTTP)."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/cache/stats", summary="Statistiques du cache des prédictions", tags=["Analyse IA"])
+async def cache_stats():
+    """Compteurs hits/misses du cache des prédictions et empreinte du modèle courant."""
+    require_model()
+    return prediction_cache.stats()
+
+@app.get("/cascade/stats", summary="Statistiques de la cascade élève / BERT", tags=["Analyse IA"])
+async def cascade_stats():
+    """Réponses de l'élève, escalades vers BERT et seuils (depuis le démarrage du worker)."""
+    require_model()
+    if cascade_engine is None:
+        return {"enabled": False}
+    return {"enabled": True, **cascade_engine.stats()}
+
+
+async def run_profile_analysis(username: str, max_tweets: int) -> AnalysisResult:
+    """
+    Pipeline complet pour un utilisateur : récupération des tweets (hors event loop),
+    prédictions batchées et résumé global. Partagé par /analyze et /analyze/batch.
+    """
+    logger.info("Récupération des tweets", extra={"username": username, "max_tweets": max_tweets})
+    # Seuls les tweets plus récents que ceux déjà stockés sont demandés à Twitter ;
+    # les appels tweepy (bloquants) tournent hors de l'event loop
+    model_fingerprint = prediction_cache.model_fingerprint
+    user_tweets = await twitter_ingestion.get_tweets(username, max_tweets, model_fingerprint=model_fingerprint)
 
     if not user_tweets:
-        print(f"   ℹ️ Aucun tweet analysable trouvé pour @{request.username}.")
+        logger.info("Aucun tweet analysable trouvé", extra={"username": username})
         return AnalysisResult(
-             username=request.username,
+             username=username,
              tweets_analyzed=0,
-             overall_summary={label: 0.0 for label in CLASS_LABELS},
+             overall_summary=empty_probabilities(),
              predictions=[]
          )
 
@@ -308,12 +477,34 @@ async def analyze_profile(request: AnalyzeRequest):
     total_predictions = {label: 0 for label in CLASS_LABELS}
     num_valid_predictions = 0
 
-    print(f"   🤖 Analyse des {len(user_tweets)} tweets récupérés...")
-    for i, tweet_data in enumerate(user_tweets):
-        print(f"      Tweet {i+1}/{len(user_tweets)}: '{tweet_data['text'][:60]}...'")
-        predicted_label, probabilities = predict_mental_state(tweet_data['text'])
+    # Les tweets déjà scorés par le modèle courant gardent leur prédiction stockée :
+    # une nouvelle analyse ne coûte que les nouveaux tweets
+    to_score = [tweet for tweet in user_tweets if tweet['prediction'] is None]
+    newly_scored = [] # Tweets scorés pour la première fois par ce modèle : alimentent les agrégats
+    logger.info("Analyse des nouveaux tweets", extra={
+        "username": username, "to_score": len(to_score), "tweets": len(user_tweets)
+    })
+    if to_score:
+        # Tous les tweets sont soumis d'un coup : le moteur les regroupe en batchs
+        # (éventuellement avec les tweets d'autres requêtes concurrentes)
+        # 429 si la file d'inférence est pleine, 504 si le délai est dépassé
+        new_predictions = await run_inference(serving_engine(), [tweet['text'] for tweet in to_score], cache=prediction_cache)
+        for tweet, prediction in zip(to_score, new_predictions):
+            tweet['prediction'] = prediction
+        written_ids = await asyncio.to_thread(
+            twitter_ingestion.store_predictions,
+            [tweet['id'] for tweet in to_score], new_predictions, model_fingerprint
+        )
+        newly_scored = [tweet for tweet in to_score if tweet['id'] in written_ids]
+    predictions = [tweet['prediction'] for tweet in user_tweets]
+
+    log_tweets = logger.isEnabledFor(logging.DEBUG) # Détail par tweet seulement en DEBUG
+    for i, (tweet_data, (predicted_label, probabilities, answered_by)) in enumerate(zip(user_tweets, predictions)):
+        if log_tweets:
+            logger.debug("Tweet %d/%d -> %s", i + 1, len(user_tweets), predicted_label,
+                         extra={"username": username, "tweet_id": tweet_data['id']})
 
-        if predicted_label not in ["Invalid Input", "Prediction Error"]:
+        if predicted_label not in [INVALID_INPUT_LABEL, PREDICTION_ERROR_LABEL]:
             total_predictions[predicted_label] += 1
             num_valid_predictions += 1
 
@@ -324,7 +515,8 @@ async def analyze_profile(request: AnalyzeRequest):
              likes=tweet_data['likes'],
              retweets=tweet_data['retweets'],
              predicted_state=predicted_label,
-             probabilities=probabilities
+             probabilities=probabilities,
+             answered_by=answered_by
         ))
 
     overall_summary_percent = {}
@@ -332,21 +524,185 @@ async def analyze_profile(request: AnalyzeRequest):
         for label, count in total_predictions.items():
             percentage = round((count / num_valid_predictions) * 100, 1)
             overall_summary_percent[label] = percentage
-        print(f"   📊 Résumé calculé sur {num_valid_predictions} prédictions valides.")
     else:
-         print(f"   ⚠️ Aucune prédiction valide n'a pu être faite.")
-         overall_summary_percent = {label: 0.0 for label in CLASS_LABELS}
+         logger.warning("Aucune prédiction valide n'a pu être faite", extra={"username": username})
+         overall_summary_percent = empty_probabilities()
 
-    print(f"✅ Analyse terminée pour @{request.username}. Résumé: {overall_summary_percent}")
+    logger.info("Analyse terminée", extra={
+        "username": username, "valid_predictions": num_valid_predictions, "summary": overall_summary_percent
+    })
+
+    # Historique + agrégats jour/semaine : un échec d'écriture ne fait pas échouer l'analyse
+    try:
+        await asyncio.to_thread(
+            analysis_history.record_analysis,
+            username, len(results), overall_summary_percent, newly_scored, model_fingerprint
+        )
+    except Exception as e:
+        logger.warning("Impossible d'enregistrer l'historique: %s", e, extra={"username": username})
 
     return AnalysisResult(
-        username=request.username,
+        username=username,
         tweets_analyzed=len(results),
         overall_summary=overall_summary_percent,
         predictions=results
     )
 
 
+@app.post("/analyze",
+          response_model=AnalysisResult,
+          summary="Analyser les tweets d'un utilisateur",
+          tags=["Analyse IA"])
+async def analyze_profile(request: AnalyzeRequest, http_request: Request):
+    """
+    Récupère les tweets d'un utilisateur Twitter, prédit l'état mental
+    pour chaque tweet et retourne un résumé global.
+
+    Avec `"format": "compact"`, la réponse est en colonnes (voir response_encoding.py) :
+    `labels` une seule fois, `probabilities` en tableaux, texte facultatif (`include_text`),
+    compressée en brotli ou gzip selon l'en-tête Accept-Encoding.
+    """
+    require_model()
+    result = await run_profile_analysis(request.username, request.max_tweets)
+    if request.format != "compact":
+        return result # Schéma AnalysisResult inchangé pour les clients existants
+    accept_encoding = http_request.headers.get("accept-encoding", "")
+    payload = response_encoding.compact_analysis(result, include_text=request.include_text)
+    return response_encoding.encoded_response(payload, accept_encoding)
+
+
+@app.get("/analyses/{username}/latest",
+         response_model=AnalysisSummary,
+         summary="Dernier résumé d'analyse d'un utilisateur",
+         tags=["Historique"])
+async def latest_analysis(username: str):
+    """Résumé de la dernière analyse enregistrée (sans appel Twitter ni inférence)."""
+    summary = await analysis_history.latest_summary(username)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"Aucune analyse enregistrée pour @{username}.")
+    return summary
+
+
+@app.get("/analyses/{username}/trend",
+         response_model=TrendResponse,
+         summary="Évolution des états prédits par jour ou par semaine",
+         tags=["Historique"])
+async def analysis_trend(username: str,
+                         period: Literal["day", "week"] = "day",
+                         limit: int = Query(30, gt=0, le=analysis_history.MAX_TREND_POINTS)):
+    """Série lue directement dans les agrégats maintenus à chaque nouvelle prédiction."""
+    result = await analysis_history.trend(username, period, limit)
+    return TrendResponse(username=username, period=period, **result)
+
+
+def _encode_stream_record(record: dict, stream_format: str) -> str:
+    """Sérialise un enregistrement en une ligne NDJSON ou un événement SSE."""
+    payload = json.dumps(jsonable_encoder(record), ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {record['type']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+@app.post("/analyze/batch",
+          summary="Analyser les tweets de plusieurs utilisateurs (résultats en flux)",
+          tags=["Analyse IA"])
+async def analyze_batch(request: BatchAnalyzeRequest, http_request: Request):
+    """
+    Lance les analyses de tous les utilisateurs en parallèle et diffuse chaque résultat
+    dès qu'il est prêt, en NDJSON (par défaut) ou en Server-Sent Events
+    (`format="sse"` ou en-tête `Accept: text/event-stream`).
+
+    Enregistrements émis :
+    - `{"type": "tweet", ...}` pour chaque TweetPrediction (si `include_predictions`)
+    - `{"type": "user", ...}` pour chaque AnalysisResult (sans la liste des prédictions)
+    - `{"type": "error", "username", "status_code", "detail"}` si un utilisateur échoue
+    - `{"type": "summary", ...}` en dernier : agrégat sur l'ensemble du lot
+    """
+    require_model()
+    stream_format = request.format
+    if stream_format is None:
+        stream_format = "sse" if "text/event-stream" in http_request.headers.get("accept", "") else "ndjson"
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+
+    logger.info("Requête batch reçue", extra={"users": len(request.users), "format": stream_format})
+
+    # Limiter le nombre d'analyses simultanées à la taille du pool Twitter :
+    # au-delà, les appels seraient refusés (503) au lieu d'attendre leur tour
+    semaphore = asyncio.Semaphore(twitter_executor.max_workers)
+
+    async def analyze_one(user: BatchUser):
+        async with semaphore:
+            try:
+                return user, await run_profile_analysis(user.username, user.max_tweets), None
+            except HTTPException as e:
+                return user, None, e
+            except Exception:
+                logger.exception("Erreur inattendue lors de l'analyse batch", extra={"username": user.username})
+                return user, None, HTTPException(status_code=500, detail="Erreur interne inattendue lors de l'analyse.")
+
+    async def stream():
+        start_time = time.perf_counter()
+        tasks = [asyncio.create_task(analyze_one(user)) for user in request.users]
+        label_counts = {label: 0 for label in CLASS_LABELS}
+        tweets_analyzed = 0
+        valid_predictions = 0 # Hors "Invalid Input" / "Prediction Error" : base du résumé global
+        succeeded = 0
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                user, result, error = await next_done
+                if error is not None:
+                    failed += 1
+                    yield _encode_stream_record({
+                        "type": "error",
+                        "username": user.username,
+                        "status_code": error.status_code,
+                        "detail": error.detail,
+                    }, stream_format)
+                    continue
+
+                succeeded += 1
+                tweets_analyzed += result.tweets_analyzed
+                for prediction in result.predictions:
+                    if prediction.predicted_state in label_counts:
+                        label_counts[prediction.predicted_state] += 1
+                        valid_predictions += 1
+
+                if request.include_predictions:
+                    for prediction in result.predictions:
+                        yield _encode_stream_record({"type": "tweet", "username": user.username, **jsonable_encoder(prediction)}, stream_format)
+                yield _encode_stream_record({
+                    "type": "user",
+                    "username": result.username,
+                    "tweets_analyzed": result.tweets_analyzed,
+                    "overall_summary": result.overall_summary,
+                    "elapsed_s": round(time.perf_counter() - start_time, 3),
+                }, stream_format)
+
+            overall_summary = empty_probabilities()
+            if valid_predictions > 0:
+                overall_summary = {
+                    label: round(count / valid_predictions * 100, 1)
+                    for label, count in label_counts.items()
+                }
+            yield _encode_stream_record({
+                "type": "summary",
+                "users_requested": len(request.users),
+                "users_succeeded": succeeded,
+                "users_failed": failed,
+                "tweets_analyzed": tweets_analyzed,
+                "overall_summary": overall_summary,
+                "elapsed_s": round(time.perf_counter() - start_time, 3),
+            }, stream_format)
+            logger.info("Analyse batch terminée", extra={"succeeded": succeeded, "failed": failed})
+        finally:
+            # Client déconnecté : ne pas laisser tourner les analyses restantes
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type=media_type)
+
+
 # --- Point d'entrée pour Uvicorn (lancement via terminal) ---
 # L'utilisation de cette section n'est pas recommandée pour un lancement standard avec 'uvicorn main:app'
 # car elle pourrait bypasser certains setups d'environnement ou de rechargement automatique.
@@ -363,6 +719,6 @@ async def analyze_profile(request: AnalyzeRequest):
 #         log_level="info"
 #     )
 
-print("✅ Exécution du script principal terminée. Prêt à être démarré par Uvicorn.")
+logger.info("Exécution du script principal terminée. Prêt à être démarré par Uvicorn.")
 # Le message "API Analyse IA & Gestion Docteurs est en ligne" sera affiché
 # lorsque l'événement startup sera terminé par Uvicorn.
\ No newline at end of file
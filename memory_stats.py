@@ -0,0 +1,121 @@
+# memory_stats.py - Mémoire unique / partagée par processus (Linux, /proc/<pid>/smaps*)
+#
+# Usage (vérifier le partage des poids entre workers):
+#   MODEL_SHARED_WEIGHTS=1 uvicorn main:app --workers 4
+#   python memory_stats.py --pid <pid du processus maître uvicorn/gunicorn>
+#
+# - unique : pages privées au processus (activations, tas Python, copies privées des poids)
+# - shared : pages présentes aussi dans au moins un autre processus (poids mappés, bibliothèques)
+# - pss    : part proportionnelle ; la somme des PSS des workers est leur coût réel sur la machine
+# Une page du fichier de poids n'apparaît comme partagée qu'à partir de deux processus qui la mappent.
+
+# --- Standard Libraries ---
+import argparse
+import os
+
+_KB = 1024
+
+
+def _pid_path(pid, name: str) -> str:
+    return f"/proc/{pid}/{name}"
+
+
+def read_smaps_rollup(pid="self") -> dict:
+    """Compteurs de /proc/<pid>/smaps_rollup, en octets (dictionnaire vide hors Linux)."""
+    values = {}
+    try:
+        with open(_pid_path(pid, "smaps_rollup"), encoding="ascii") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    values[parts[0].rstrip(":")] = int(parts[1]) * _KB
+    except OSError:
+        pass
+    return values
+
+
+def process_memory(pid="self") -> dict:
+    """RSS, PSS, mémoire unique (privée) et partagée d'un processus, en octets."""
+    rollup = read_smaps_rollup(pid)
+    return {
+        "rss": rollup.get("Rss", 0),
+        "pss": rollup.get("Pss", 0),
+        "unique": rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0),
+        "shared": rollup.get("Shared_Clean", 0) + rollup.get("Shared_Dirty", 0),
+        "swap": rollup.get("Swap", 0),
+    }
+
+
+def mapping_memory(path: str, pid="self") -> dict:
+    """Même découpage, limité aux zones mappées depuis `path` (ex: model.safetensors)."""
+    target = os.path.realpath(path)
+    totals = {"rss": 0, "pss": 0, "unique": 0, "shared": 0}
+    fields = {
+        "Rss": "rss", "Pss": "pss",
+        "Private_Clean": "unique", "Private_Dirty": "unique",
+        "Shared_Clean": "shared", "Shared_Dirty": "shared",
+    }
+    try:
+        with open(_pid_path(pid, "smaps"), encoding="utf-8", errors="replace") as f:
+            in_target = False
+            for line in f:
+                parts = line.split()
+                if not parts:
+                    continue
+                if "-" in parts[0] and not parts[0].endswith(":"): # En-tête d'une zone mappée
+                    in_target = len(parts) >= 6 and parts[5] == target
+                elif in_target and parts[0].rstrip(":") in fields:
+                    totals[fields[parts[0].rstrip(":")]] += int(parts[1]) * _KB
+    except OSError:
+        pass
+    return totals
+
+
+def memory_report(weights_path: str | None = None, pid="self") -> dict:
+    """Rapport d'un processus (utilisé par GET /health/memory et par la CLI)."""
+    report = {"pid": os.getpid() if pid == "self" else int(pid), **process_memory(pid)}
+    if weights_path:
+        report["weights"] = {"path": weights_path, **mapping_memory(weights_path, pid)}
+    return report
+
+
+def child_pids(pid: int) -> list[int]:
+    """Processus enfants directs (workers uvicorn/gunicorn) d'un processus maître."""
+    children = []
+    try:
+        for task in os.listdir(_pid_path(pid, "task")):
+            with open(_pid_path(pid, f"task/{task}/children"), encoding="ascii") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return sorted(set(children))
+
+
+def _mb(value: int) -> str:
+    return f"{value / (1024 * 1024):.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire unique / partagée des workers (Linux).")
+    parser.add_argument("--pid", type=int, required=True, help="PID du processus maître (ou d'un worker)")
+    parser.add_argument("--weights", default=None, help="Fichier de poids mappé (par défaut: celui de l'artefact)")
+    args = parser.parse_args()
+
+    weights = args.weights
+    if weights is None:
+        artifact_dir = os.getenv("MODEL_ARTIFACT_DIR", "model/bert_mental_health")
+        weights = os.path.join(artifact_dir, "model.safetensors")
+
+    pids = child_pids(args.pid) or [args.pid]
+    print(f"{'pid':>8} {'rss':>9} {'pss':>9} {'unique':>9} {'shared':>9} {'poids rss':>10} {'poids part.':>11}  (Mo)")
+    total_pss = 0
+    for pid in pids:
+        report = memory_report(weights, pid)
+        total_pss += report["pss"]
+        print(f"{pid:>8} {_mb(report['rss']):>9} {_mb(report['pss']):>9} {_mb(report['unique']):>9} "
+              f"{_mb(report['shared']):>9} {_mb(report['weights']['rss']):>10} {_mb(report['weights']['shared']):>11}")
+    print(f"\nCoût total des {len(pids)} processus (somme des PSS): {_mb(total_pss)} Mo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# metrics.py - Métriques Prometheus par étape du pipeline (exposées par GET /metrics)
+
+# --- Standard Libraries ---
+import time
+
+# --- Third-Party Libraries ---
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+
+# --- Local Application Imports ---
+from memory_stats import process_memory
+
+# Bornes en secondes : de la requête MongoDB indexée (~ms) à l'appel Twitter endormi sur un rate limit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# --- Twitter ---
+TWITTER_FETCH_SECONDS = Histogram(
+    "twitter_fetch_seconds", "Durée d'un appel à l'API Twitter", ["call"], buckets=LATENCY_BUCKETS
+)
+
+# --- Inférence ---
+TOKENIZATION_SECONDS = Histogram(
+    "inference_tokenization_seconds", "Durée de tokenisation d'un batch (prétraitement compris)", buckets=LATENCY_BUCKETS
+)
+FORWARD_SECONDS = Histogram(
+    "inference_forward_seconds", "Durée d'un forward pass (un bucket de longueur)", buckets=LATENCY_BUCKETS
+)
+BATCH_SIZE = Histogram(
+    "inference_batch_size", "Nombre de textes par batch du moteur", buckets=BATCH_SIZE_BUCKETS
+)
+QUEUE_DEPTH = Gauge("inference_queue_depth", "Textes en attente dans la file du moteur d'inférence")
+CASCADE_ANSWERS = Counter(
+    "cascade_answers_total", "Textes classés par la cascade, par modèle ayant répondu", ["model"] # student | bert
+)
+
+# --- Cache des prédictions ---
+CACHE_LOOKUPS = Counter(
+    "prediction_cache_lookups_total", "Recherches dans le cache des prédictions", ["result"] # memory_hit | mongo_hit | miss
+)
+CACHE_HIT_RATIO = Gauge("prediction_cache_hit_ratio", "Part des recherches servies par le cache depuis le démarrage")
+
+# --- MongoDB ---
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_seconds", "Latence des commandes MongoDB", ["command", "outcome"], buckets=LATENCY_BUCKETS
+)
+
+# --- Mémoire du worker (poids partagés entre workers : MODEL_SHARED_WEIGHTS=1) ---
+PROCESS_UNIQUE_MEMORY = Gauge("process_unique_memory_bytes", "Pages privées du worker (smaps_rollup)")
+PROCESS_UNIQUE_MEMORY.set_function(lambda: process_memory()["unique"])
+PROCESS_SHARED_MEMORY = Gauge("process_shared_memory_bytes", "Pages partagées avec d'autres processus (smaps_rollup)")
+PROCESS_SHARED_MEMORY.set_function(lambda: process_memory()["shared"])
+
+# --- HTTP ---
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "Latence des requêtes par route", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+HTTP_ERRORS = Counter(
+    "http_errors_total", "Réponses en erreur par route et code HTTP", ["method", "route", "status"]
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Écouteur pymongo/Motor : chaque commande alimente mongo_command_seconds."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.labels(event.command_name, "success").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.labels(event.command_name, "failure").observe(event.duration_micros / 1e6)
+
+
+class timed:
+    """Context manager : observe la durée du bloc dans un histogramme (déjà labellisé si besoin)."""
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+def observe_request(method: str, route: str, status: int, elapsed_s: float):
+    HTTP_REQUEST_SECONDS.labels(method, route, str(status)).observe(elapsed_s)
+    if status >= 400:
+        HTTP_ERRORS.labels(method, route, str(status)).inc()
+
+
+def render() -> tuple[bytes, str]:
+    """Corps et type de contenu de la réponse /metrics (format texte Prometheus)."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,226 @@
+# prediction_cache.py - Cache des prédictions adressé par contenu (LRU/TTL en mémoire + MongoDB)
+
+# --- Standard Libraries ---
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# --- Third-Party Libraries ---
+from pymongo import UpdateOne
+
+# --- Local Application Imports ---
+import database
+from labels import CLASS_LABELS, FULL_MODEL
+from metrics import CACHE_LOOKUPS
+
+# --- Configuration ---
+CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "50000"))    # Taille max du tier mémoire (LRU)
+CACHE_TTL_S = int(os.getenv("PREDICTION_CACHE_TTL_S", str(7 * 24 * 3600)))     # Durée de vie d'une entrée (s)
+CACHE_USE_MONGO = os.getenv("PREDICTION_CACHE_MONGO", "1") == "1"              # Active le tier partagé MongoDB
+CACHE_COLLECTION = os.getenv("PREDICTION_CACHE_COLLECTION", "prediction_cache")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalise un texte avant hachage. Le tokenizer BERT étant 'uncased',
+    la casse et les espaces multiples n'influencent pas la prédiction.
+    """
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+def file_fingerprint(path: str, chunk_size: int = 1 << 20) -> str:
+    """Calcule l'empreinte SHA-256 (tronquée) du fichier de poids du modèle."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Cache (label, probabilités, modèle ayant répondu) indexé par sha256(empreinte modèle + texte normalisé).
+
+    - Tier 1 : LRU en mémoire, borné par `max_entries`, avec TTL.
+    - Tier 2 (optionnel) : collection MongoDB partagée entre workers et redémarrages,
+      expirée par un index TTL.
+    L'empreinte est celle des poids réellement chargés au démarrage et ne change plus ensuite :
+    remplacer le fichier de poids sans redémarrer ne doit pas ranger les prédictions de l'ancien
+    modèle sous l'empreinte du nouveau (tier MongoDB partagé, tweets stockés, agrégats).
+    Un nouveau modèle est pris en compte au redémarrage des workers.
+    """
+
+    def __init__(self, model_path: str,
+                 max_entries: int = CACHE_MAX_ENTRIES,
+                 ttl_s: int = CACHE_TTL_S,
+                 use_mongo: bool = CACHE_USE_MONGO,
+                 collection_name: str = CACHE_COLLECTION,
+                 salt: str = "",
+                 weights_fingerprint: str | None = None):
+        self.model_path = model_path
+        self.salt = salt # Ex: version du prétraitement, qui change les prédictions autant que les poids
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.use_mongo = use_mongo
+        self.collection_name = collection_name
+
+        self._entries: OrderedDict = OrderedDict()  # clé -> (expire_at, label, probabilités, answered_by)
+        self._lock = threading.Lock()
+        # Calculée par l'appelant avant le chargement du modèle (voir main.load_ai_resources), sinon ici
+        if weights_fingerprint is None:
+            weights_fingerprint = file_fingerprint(model_path) if os.path.exists(model_path) else "no-model"
+        self._model_fingerprint = f"{weights_fingerprint}-{salt}" if salt else weights_fingerprint
+
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+
+    # --- Empreinte du modèle ---
+    @property
+    def model_fingerprint(self) -> str:
+        """Empreinte des poids chargés par ce processus (fixe pour toute sa durée de vie)."""
+        return self._model_fingerprint
+
+    def key_for(self, text: str) -> str:
+        payload = f"{self.model_fingerprint}\x00{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # --- Tier mémoire ---
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _memory_get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expire_at, label, probabilities, answered_by = entry
+            if expire_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return label, dict(probabilities), answered_by
+
+    def _memory_put(self, key: str, label: str, probabilities: dict, answered_by: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_s, label, dict(probabilities), answered_by)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # --- Tier MongoDB ---
+    def _collection(self):
+        if not self.use_mongo:
+            return None
+        try:
+            return database.get_db()[self.collection_name]
+        except RuntimeError:
+            return None # Base non initialisée : on se contente du tier mémoire
+
+    def ensure_indexes(self):
+        """Crée l'index TTL de la collection partagée (appelé au démarrage)."""
+        collection = self._collection()
+        if collection is None:
+            return
+        try:
+            collection.create_index("created_at", expireAfterSeconds=self.ttl_s)
+            logger.info("Cache des prédictions: index TTL prêt", extra={"collection": self.collection_name})
+        except Exception as e:
+            logger.warning("Impossible de créer l'index TTL du cache des prédictions: %s", e)
+
+    # --- API publique ---
+    def get_many(self, texts: list[str]) -> list:
+        """
+        Retourne, pour chaque texte, (label, probabilités, answered_by) si présent en cache, sinon None.
+        Les textes absents du tier mémoire sont cherchés en une seule requête MongoDB.
+        """
+        keys = [self.key_for(text) for text in texts]
+        results = [self._memory_get(key) for key in keys]
+
+        missing = {key for key, result in zip(keys, results) if result is None}
+        collection = self._collection() if missing else None
+        if collection is not None:
+            try:
+                found = {
+                    # Entrées écrites avant la cascade : toujours produites par BERT
+                    doc["_id"]: (doc["label"], doc["probabilities"], doc.get("answered_by", FULL_MODEL))
+                    for doc in collection.find(
+                        {"_id": {"$in": list(missing)}, "model": self.model_fingerprint},
+                        {"label": 1, "probabilities": 1, "answered_by": 1}
+                    )
+                }
+            except Exception as e:
+                logger.warning("Lecture du cache MongoDB impossible: %s", e)
+                found = {}
+            for i, key in enumerate(keys):
+                if results[i] is None and key in found:
+                    label, probabilities, answered_by = found[key]
+                    self._memory_put(key, label, probabilities, answered_by)
+                    results[i] = (label, dict(probabilities), answered_by)
+                    self.mongo_hits += 1
+                    CACHE_LOOKUPS.labels("mongo_hit").inc()
+
+        for key, result in zip(keys, results):
+            if result is None:
+                self.misses += 1
+                CACHE_LOOKUPS.labels("miss").inc()
+            elif key not in missing:
+                self.memory_hits += 1
+                CACHE_LOOKUPS.labels("memory_hit").inc()
+        return results
+
+    def put_many(self, texts: list[str], predictions: list):
+        """Enregistre des prédictions valides dans les deux tiers."""
+        operations = []
+        now = datetime.now(timezone.utc)
+        fingerprint = self.model_fingerprint
+        for text, (label, probabilities, answered_by) in zip(texts, predictions):
+            if label not in CLASS_LABELS: # Pas de cache pour "Invalid Input" / "Prediction Error"
+                continue
+            key = self.key_for(text)
+            self._memory_put(key, label, probabilities, answered_by)
+            operations.append(UpdateOne(
+                {"_id": key},
+                {"$set": {
+                    "label": label, "probabilities": probabilities, "answered_by": answered_by,
+                    "model": fingerprint, "created_at": now
+                }},
+                upsert=True
+            ))
+
+        collection = self._collection() if operations else None
+        if collection is not None:
+            try:
+                collection.bulk_write(operations, ordered=False)
+            except Exception:
+                logger.exception("Écriture du cache MongoDB impossible")
+
+    def get(self, text: str):
+        return self.get_many([text])[0]
+
+    def put(self, text: str, prediction):
+        self.put_many([text], [prediction])
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.mongo_hits
+        total = hits + self.misses
+        return {
+            "model_fingerprint": self._model_fingerprint,
+            "entries_in_memory": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "mongo_enabled": self.use_mongo,
+        }
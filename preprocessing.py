@@ -0,0 +1,194 @@
+# preprocessing.py - Prétraitement du texte partagé par l'entraînement et le service
+#
+# Reproduit, dans le même ordre, les étapes du notebook d'entraînement :
+#   minuscules -> remove_html_tags -> remove_url -> remove_punc -> chat_conversion
+#   -> remove_stopwords -> tokenize_and_stem -> replace_emojis_with_labels
+# mais avec des regex précompilées et combinées, une traduction des emojis en une seule
+# passe et un stemming mémoïsé. Utilisable texte par texte (service) ou par lot (entraînement).
+#
+# Usage (préparation des données d'entraînement, remplace les cellules du notebook):
+#   python preprocessing.py mental_health_text_dataset.csv processed_data.csv
+
+# --- Standard Libraries ---
+import argparse
+import re
+import string
+from functools import lru_cache
+
+# --- Third-Party Libraries ---
+from nltk.stem import PorterStemmer
+
+# Version du prétraitement : fait partie de l'empreinte du cache des prédictions,
+# à incrémenter à chaque changement de comportement
+PREPROCESSING_VERSION = "1"
+
+# --- Dictionnaires du notebook ---
+# Seul ce dictionnaire était effectivement assigné à `chat_words` dans le notebook
+# (le second dictionnaire de la cellule n'était affecté à aucune variable).
+CHAT_WORDS = {
+    "AFAIK": "As Far As I Know",
+    "AFK": "Away From Keyboard",
+    "ASAP": "As Soon As Possible",
+}
+
+# Liste 'english' de nltk.corpus.stopwords. Les entrées avec apostrophe ne peuvent plus
+# correspondre après remove_punc mais sont gardées pour rester identiques à la liste NLTK.
+STOP_WORDS = frozenset({
+    "i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "you're", "you've",
+    "you'll", "you'd", "your", "yours", "yourself", "yourselves", "he", "him", "his", "himself",
+    "she", "she's", "her", "hers", "herself", "it", "it's", "its", "itself", "they", "them",
+    "their", "theirs", "themselves", "what", "which", "who", "whom", "this", "that", "that'll",
+    "these", "those", "am", "is", "are", "was", "were", "be", "been", "being", "have", "has",
+    "had", "having", "do", "does", "did", "doing", "a", "an", "the", "and", "but", "if", "or",
+    "because", "as", "until", "while", "of", "at", "by", "for", "with", "about", "against",
+    "between", "into", "through", "during", "before", "after", "above", "below", "to", "from",
+    "up", "down", "in", "out", "on", "off", "over", "under", "again", "further", "then", "once",
+    "here", "there", "when", "where", "why", "how", "all", "any", "both", "each", "few", "more",
+    "most", "other", "some", "such", "no", "nor", "not", "only", "own", "same", "so", "than",
+    "too", "very", "s", "t", "can", "will", "just", "don", "don't", "should", "should've", "now",
+    "d", "ll", "m", "o", "re", "ve", "y", "ain", "aren", "aren't", "couldn", "couldn't", "didn",
+    "didn't", "doesn", "doesn't", "hadn", "hadn't", "hasn", "hasn't", "haven", "haven't", "isn",
+    "isn't", "ma", "mightn", "mightn't", "mustn", "mustn't", "needn", "needn't", "shan", "shan't",
+    "shouldn", "shouldn't", "wasn", "wasn't", "weren", "weren't", "won", "won't", "wouldn",
+    "wouldn't",
+})
+
+EMOJI_LABELS = {
+    # Original entries
+    "😀": "HAPPY", "😊": "HAPPY", "😎": "COOL", "🤗": "HUG", "😌": "RELAXED",
+    "🙃": "AMUSED", "💪": "STRENGTH", "😟": "WORRIED", "😱": "PANIC",
+    "😭": "SAD", "😰": "ANXIOUS", "😩": "FRUSTRATED", "😔": "DISAPPOINTED",
+    "😧": "UNEASY", "😒": "DISPLEASED", "😤": "FRUSTRATED", "🫣": "EMBARRASSED",
+    "🤯": "EXTREME STRESS", "🤔": "CONFUSED", "😢": "SAD", "💔": "HEARTBROKEN",
+    "😕": "CONFUSED", "😵": "SHOCKED", "😲": "SURPRISED", "😡": "ANGRY",
+    "👻": "SCARED", "💃": "DANCING",
+
+    # New additions
+    "😍": "LOVE", "🤩": "EXCITED", "😨": "FEAR", "😬": "PAIN", "😪": "TIRED",
+    "😷": "SICK", "🥵": "HOT", "🥶": "COLD", "🥴": "DRUNK", "😈": "MISCHIEVOUS",
+    "👹": "MONSTER", "👺": "EVIL", "🤠": "ADVENTUROUS", "🥳": "CELEBRATING",
+    "🤑": "GREEDY", "😑": "UNIMPRESSED", "😶": "SPEECHLESS", "😐": "NEUTRAL",
+    "🙄": "SARCASM", "😏": "SMUG", "🤤": "HUNGRY", "😋": "TASTY", "🥱": "BORED",
+    "🤫": "SECRETIVE", "🤭": "SURPRISED", "🧐": "CURIOUS", "😮‍💨": "RELIEF",
+    "😵💫": "DIZZY", "🥺": "PLEADING", "🙏": "PRAYING", "✨": "MAGIC",
+    "❤️": "LOVE", "💥": "EXPLOSION", "💫": "DIZZY", "🎉": "CELEBRATE",
+    "🍕": "HUNGRY", "☕": "CAFFEINE", "🐶": "PET", "🐱": "CAT", "🌞": "SUNNY",
+    "🌧️": "RAINY", "🌈": "HOPE", "🎂": "BIRTHDAY", "🎓": "GRADUATE",
+    "🏆": "WIN", "⚽": "SPORTS", "🏋️": "WORKOUT", "🧘": "ZEN", "🚀": "LAUNCH",
+    "💡": "IDEA", "🔥": "FIRE", "🕶️": "COOL", "🎧": "MUSIC", "🎮": "GAMING",
+    "📚": "STUDYING", "🛌": "REST"
+}
+
+# --- Regex précompilées ---
+# remove_html_tags + remove_url en une seule passe
+_MARKUP_RE = re.compile(r"<.*?>|https?://\S+|www\.\S+")
+# remove_punc : ponctuation ASCII (string.punctuation)
+_PUNCT_TABLE = str.maketrans("", "", string.punctuation)
+# word_tokenize (Treebank) : contractions découpées ("cannot" -> "can not") et guillemets
+# typographiques isolés ; le reste de ses règles porte sur la ponctuation ASCII déjà retirée
+_CONTRACTIONS_RE = re.compile(r"(?i)\b(?:cannot|gimme|gonna|gotta|lemme)\b|\bwanna(?=\s)")
+_QUOTES_RE = re.compile(r"[«“‘„»”’]")
+# replace_emojis_with_labels : alternance dans l'ordre du dictionnaire, ce qui reproduit
+# exactement les str.replace successifs du notebook (ex: "😵" l'emporte sur "😵💫")
+_EMOJI_RE = re.compile("|".join(re.escape(emoji) for emoji in EMOJI_LABELS))
+
+_stemmer = PorterStemmer()
+
+
+@lru_cache(maxsize=200_000)
+def stem(word: str) -> str:
+    """PorterStemmer mémoïsé : le vocabulaire d'un corpus est petit devant son nombre de mots."""
+    return _stemmer.stem(word)
+
+
+def _split_contraction(match: re.Match) -> str:
+    word = match.group(0)
+    return f" {word[:3]} {word[3:]} " # can|not, gim|me, gon|na, got|ta, lem|me, wan|na
+
+
+def _emoji_label(match: re.Match) -> str:
+    return f" {EMOJI_LABELS[match.group(0)]} "
+
+
+def _clean(text: str) -> str:
+    """Minuscules, balises HTML, URLs et ponctuation ASCII."""
+    return _MARKUP_RE.sub("", text.lower()).translate(_PUNCT_TABLE)
+
+
+def _words_to_statement(text: str) -> str:
+    """chat_conversion + remove_stopwords + tokenize_and_stem + replace_emojis_with_labels."""
+    words = []
+    for word in text.split():
+        expansion = CHAT_WORDS.get(word.upper())
+        if expansion is None:
+            if word.lower() not in STOP_WORDS:
+                words.append(word)
+        else:
+            words.extend(w for w in expansion.split() if w.lower() not in STOP_WORDS)
+
+    tokenized = _QUOTES_RE.sub(r" \g<0> ", _CONTRACTIONS_RE.sub(_split_contraction, " ".join(words)))
+    stemmed = " ".join(stem(token) for token in tokenized.split())
+    return _EMOJI_RE.sub(_emoji_label, stemmed)
+
+
+def preprocess_text(text):
+    """Prétraite un seul texte (chemin de service). Les valeurs non-texte sont retournées telles quelles."""
+    if not isinstance(text, str):
+        return text
+    return _words_to_statement(_clean(text))
+
+
+def preprocess_texts(texts) -> list:
+    """Prétraite un lot de textes (ordre conservé)."""
+    return [preprocess_text(text) for text in texts]
+
+
+def preprocess_series(series):
+    """
+    Version vectorisée pour pandas : les étapes de nettoyage passent par les méthodes
+    .str (une passe chacune au lieu d'un .apply par étape), le reste par une seule
+    compréhension sur les mots. Les valeurs non-texte (NaN) sont conservées.
+    """
+    is_text = series.map(lambda value: isinstance(value, str))
+    cleaned = (
+        series[is_text]
+        .str.lower()
+        .str.replace(_MARKUP_RE, "", regex=True)
+        .str.translate(_PUNCT_TABLE)
+    )
+    result = series.copy()
+    result[is_text] = [_words_to_statement(text) for text in cleaned]
+    return result
+
+
+def remove_html_tags(text):
+    """Étape du notebook appliquée aussi à la colonne 'status'."""
+    if isinstance(text, str):
+        return re.sub(r"<.*?>", "", text)
+    return text
+
+
+def prepare_training_data(raw_csv: str, output_csv: str):
+    """Reproduit la préparation des données du notebook : renommage, dropna, prétraitement."""
+    import pandas as pd
+
+    data = pd.read_csv(raw_csv)
+    data = data.rename(columns={"text": "statement", "label": "status"})
+    data = data.dropna()
+    data["statement"] = preprocess_series(data["statement"])
+    data["status"] = data["status"].apply(remove_html_tags)
+    data.to_csv(output_csv, index=False)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Préparation des données d'entraînement (prétraitement du notebook).")
+    parser.add_argument("raw_csv", help="CSV brut avec colonnes text,label (ou statement,status)")
+    parser.add_argument("output_csv", help="CSV prétraité (ex: processed_data.csv)")
+    args = parser.parse_args()
+    data = prepare_training_data(args.raw_csv, args.output_csv)
+    print(f"✅ {len(data)} lignes prétraitées écrites dans {args.output_csv}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# profiling.py - Profilage par échantillonnage à la demande, requête par requête (pyinstrument)
+#
+# Activé si PROFILING_ENABLED=1 ; une requête est alors profilée quand elle porte l'en-tête
+# `X-Profile: 1`. Le rapport HTML est écrit dans PROFILE_DIR et son chemin est renvoyé
+# dans l'en-tête `X-Profile-Path`. Sans l'en-tête, le surcoût est nul.
+
+# --- Standard Libraries ---
+import logging
+import os
+import re
+import time
+
+# --- Configuration ---
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_S = float(os.getenv("PROFILE_INTERVAL_S", "0.001")) # Période d'échantillonnage
+PROFILE_HEADER = "x-profile"
+
+logger = logging.getLogger(__name__)
+
+
+def wants_profile(headers) -> bool:
+    return PROFILING_ENABLED and headers.get(PROFILE_HEADER) == "1"
+
+
+def start_profiler():
+    """Démarre un profiler pyinstrument (mode async : suit la requête à travers les await)."""
+    from pyinstrument import Profiler # Dépendance optionnelle, importée seulement à l'usage
+
+    profiler = Profiler(interval=PROFILE_INTERVAL_S, async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+def save_profile(profiler, route: str) -> str:
+    """
+    Écrit le rapport HTML d'un profiler déjà arrêté (stop() doit être appelé sur le thread
+    qui l'a démarré ; cette fonction peut tourner ailleurs). Retourne son chemin.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^\w.-]+", "_", route.strip("/")) or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{slug}.html"
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(profiler.output_html())
+    logger.info("Profil de requête enregistré", extra={"route": route, "path": path})
+    return path
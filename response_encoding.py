@@ -0,0 +1,111 @@
+# response_encoding.py - Format compact (colonnes) et compression négociée des réponses /analyze
+#
+# Opt-in par requête (`"format": "compact"`) : le format par défaut (AnalysisResult) ne change pas.
+# - labels listés une seule fois, probabilités en tableaux dans l'ordre de `labels` ;
+# - une colonne par champ de tweet, texte facultatif (`"include_text": false`) ;
+# - sérialisation orjson si disponible (sinon json) ;
+# - compression brotli ou gzip selon Accept-Encoding, au-delà de COMPRESS_MIN_BYTES.
+
+# --- Standard Libraries ---
+import gzip
+import json
+import os
+
+# --- Third-Party Libraries ---
+from starlette.responses import Response
+
+try:
+    import orjson # Dépendance optionnelle : encodage JSON plusieurs fois plus rapide
+except ImportError:
+    orjson = None
+try:
+    import brotli # Dépendance optionnelle : "br" n'est proposé que si elle est installée
+except ImportError:
+    brotli = None
+
+# --- Local Application Imports ---
+from labels import CLASS_LABELS, INVALID_INPUT_LABEL, PREDICTION_ERROR_LABEL
+
+# --- Configuration ---
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))   # En dessous, la compression ne paie pas
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))              # 4-5 : bon ratio, coût CPU faible
+
+COMPACT_MEDIA_TYPE = "application/json"
+# États possibles d'un tweet : les labels du modèle puis les états sans prédiction
+STATES = CLASS_LABELS + [INVALID_INPUT_LABEL, PREDICTION_ERROR_LABEL]
+_STATE_INDEX = {state: i for i, state in enumerate(STATES)}
+
+
+def dumps(payload) -> bytes:
+    """JSON compact en UTF-8 (orjson si installé)."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compact_analysis(result, include_text: bool = True) -> dict:
+    """
+    AnalysisResult -> disposition en colonnes. `predicted_state[i]` indexe `states`,
+    `probabilities[i]` suit l'ordre de `labels`.
+    """
+    predictions = result.predictions
+    tweets = {
+        "id": [p.id for p in predictions],
+        "created_at": [p.created_at for p in predictions],
+        "likes": [p.likes for p in predictions],
+        "retweets": [p.retweets for p in predictions],
+        "predicted_state": [_STATE_INDEX[p.predicted_state] for p in predictions],
+        "probabilities": [[p.probabilities.get(label, 0.0) for label in CLASS_LABELS] for p in predictions],
+        "answered_by": [p.answered_by for p in predictions],
+    }
+    if include_text:
+        tweets["text"] = [p.text for p in predictions]
+    return {
+        "format": "compact",
+        "username": result.username,
+        "tweets_analyzed": result.tweets_analyzed,
+        "labels": CLASS_LABELS,
+        "states": STATES,
+        "overall_summary": [result.overall_summary.get(label, 0.0) for label in CLASS_LABELS],
+        "tweets": tweets,
+    }
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """Choisit "br" ou "gzip" d'après Accept-Encoding (q-values respectées, br préféré à égalité)."""
+    preferences = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            preferences[name.strip()] = q
+    wildcard = preferences.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    scored = [(preferences.get(name, wildcard), -rank, name) for rank, name in enumerate(candidates)]
+    q, _, name = max(scored)
+    return name if q > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def encoded_response(payload, accept_encoding: str = "", status_code: int = 200) -> Response:
+    """Réponse JSON sérialisée rapidement et compressée si le client l'accepte."""
+    body = dumps(payload)
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding is not None:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type=COMPACT_MEDIA_TYPE, headers=headers)
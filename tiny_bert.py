@@ -0,0 +1,49 @@
+# tiny_bert.py - Petit BERT aléatoire et tokenizer WordPiece local (tests CPU, benchmarks, --tiny)
+#
+# Aucun accès au hub : permet de faire tourner train.py / distill.py / les benchmarks
+# de bout en bout sans le modèle fine-tuné ni bert-base-uncased.
+
+# --- Standard Libraries ---
+import os
+import tempfile
+
+# --- Third-Party Libraries ---
+import torch
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+# --- Local Application Imports ---
+from labels import NUM_LABELS
+
+# Vocabulaire fixe : textes reproductibles d'un run à l'autre (graine fixe)
+WORDS = (
+    "i feel so tired today and nothing seems to help anymore work was fine but "
+    "my head keeps spinning about the exam tomorrow cannot sleep again happy with "
+    "friends weekend coffee anxious stressed alone hope better soon why always me "
+    "life good great love hate panic worried sad calm breathe walk music study"
+).split()
+
+
+def tiny_tokenizer() -> BertTokenizerFast:
+    """Tokenizer WordPiece construit localement (aucun accès au hub)."""
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted(set(WORDS)) + list("abcdefghijklmnopqrstuvwxyz")
+    vocab += [f"##{c}" for c in "abcdefghijklmnopqrstuvwxyz"]
+    directory = tempfile.mkdtemp(prefix="tiny-tokenizer-")
+    vocab_file = os.path.join(directory, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab))
+    return BertTokenizerFast(vocab_file=vocab_file, do_lower_case=True)
+
+
+def tiny_model(vocab_size: int, seed: int = 0) -> BertForSequenceClassification:
+    """Petit BERT initialisé aléatoirement (2 couches, 128 dimensions) pour des mesures rapides."""
+    torch.manual_seed(seed)
+    config = BertConfig(
+        vocab_size=vocab_size,
+        hidden_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=512,
+        max_position_embeddings=512,
+        num_labels=NUM_LABELS,
+    )
+    return BertForSequenceClassification(config).eval()
@@ -0,0 +1,103 @@
+# tokenizer_parity.py - Vérifie que le chemin "tokenizer rapide + buckets" reproduit le chemin historique
+#
+# Usage:
+#   python tokenizer_parity.py data-final.csv --sample 2000
+#   python tokenizer_parity.py data-final.csv --sample 200 --model model/bert_mental_health_model.bin
+#
+# 1. Compare les input_ids / attention_mask / token_type_ids du BertTokenizer (Python)
+#    et du BertTokenizerFast (Rust) sur un échantillon du CSV.
+# 2. Avec --model : compare les prédictions texte par texte (ancien predict_mental_state)
+#    et celles du moteur batché par buckets (label identique, écart max de probabilité).
+# Code de sortie 1 si une divergence est trouvée.
+
+# --- Standard Libraries ---
+import argparse
+import sys
+
+# --- Third-Party Libraries ---
+import pandas as pd
+import torch
+import torch.nn.functional as F
+from transformers import BertTokenizer, BertTokenizerFast, BertForSequenceClassification
+
+# --- Local Application Imports ---
+from inference import CLASS_LABELS, NUM_LABELS, MAX_LENGTH, InferenceEngine
+
+
+def load_sample(csv_path: str, sample: int, seed: int) -> list[str]:
+    data = pd.read_csv(csv_path).dropna(subset=["statement"])
+    if sample and sample < len(data):
+        data = data.sample(n=sample, random_state=seed)
+    return data["statement"].astype(str).tolist()
+
+
+def check_tokenizers(texts: list[str]) -> int:
+    """Retourne le nombre de textes dont l'encodage diffère entre les deux tokenizers."""
+    slow = BertTokenizer.from_pretrained("bert-base-uncased")
+    fast = BertTokenizerFast.from_pretrained("bert-base-uncased")
+
+    fast_batch = fast(texts, padding=False, truncation=True, max_length=MAX_LENGTH)
+    mismatches = 0
+    for i, text in enumerate(texts):
+        slow_encoding = slow(text, padding=False, truncation=True, max_length=MAX_LENGTH)
+        for key in ("input_ids", "attention_mask", "token_type_ids"):
+            if slow_encoding[key] != fast_batch[key][i]:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"   ❌ Divergence ({key}) pour: '{text[:80]}'")
+                break
+    print(f"🔤 Tokenizers: {len(texts) - mismatches}/{len(texts)} encodages identiques.")
+    return mismatches
+
+
+def check_predictions(texts: list[str], model_path: str, tolerance: float) -> int:
+    """Compare l'ancien chemin (un texte, tokenizer Python) au moteur batché (tokenizer rapide, buckets)."""
+    slow = BertTokenizer.from_pretrained("bert-base-uncased")
+    fast = BertTokenizerFast.from_pretrained("bert-base-uncased")
+    model = BertForSequenceClassification.from_pretrained("bert-base-uncased", num_labels=NUM_LABELS)
+    model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    model.eval()
+
+    engine = InferenceEngine(model, fast, torch.device("cpu"))
+    batched = engine.predict_many(texts)
+    engine.stop()
+
+    label_mismatches = 0
+    max_delta = 0.0
+    for text, (batched_label, batched_probabilities) in zip(texts, batched):
+        inputs = slow(text, return_tensors="pt", padding=True, truncation=True, max_length=MAX_LENGTH)
+        with torch.no_grad():
+            probabilities = F.softmax(model(**inputs).logits, dim=1)[0]
+        reference_label = CLASS_LABELS[torch.argmax(probabilities).item()]
+        if reference_label != batched_label:
+            label_mismatches += 1
+        for i, label in enumerate(CLASS_LABELS):
+            max_delta = max(max_delta, abs(round(probabilities[i].item() * 100, 2) - batched_probabilities[label]))
+
+    print(f"🧠 Prédictions: {len(texts) - label_mismatches}/{len(texts)} labels identiques, "
+          f"écart max de probabilité: {max_delta:.3f} points (tolérance: {tolerance}).")
+    return label_mismatches + (1 if max_delta > tolerance else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parité tokenizer Python / tokenizer rapide + buckets.")
+    parser.add_argument("csv_path", help="CSV avec une colonne 'statement' (ex: data-final.csv)")
+    parser.add_argument("--sample", type=int, default=2000, help="Nombre de lignes échantillonnées (0 = toutes)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--model", default=None, help="Chemin du .bin pour comparer aussi les prédictions")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Écart max de probabilité toléré (en points de %%)")
+    args = parser.parse_args()
+
+    texts = load_sample(args.csv_path, args.sample, args.seed)
+    failures = check_tokenizers(texts)
+    if args.model:
+        failures += check_predictions(texts, args.model, args.tolerance)
+
+    if failures:
+        print("❌ Parité non respectée.")
+        sys.exit(1)
+    print("✅ Parité respectée.")
+
+
+if __name__ == "__main__":
+    main()
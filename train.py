@@ -0,0 +1,366 @@
+# train.py - Fine-tuning de BERT (remplace les cellules d'entraînement du notebook)
+#
+# Usage:
+#   python train.py data-final.csv --output model/bert_mental_health_model.bin
+#   python train.py data-final.csv --grad-accum 4 --batch-size 8          # même batch effectif, moins de mémoire
+#   python train.py data-final.csv --resume                                # reprend depuis checkpoints/last.pt
+#   python train.py data-final.csv --tiny --limit 500 --epochs 1           # petit BERT aléatoire, CPU, pour les tests
+#
+# Par rapport au notebook (encode_plus + padding='max_length' à chaque item, à chaque époque) :
+# - le corpus est tokenisé une seule fois, dans un cache de tableaux numpy mappés en mémoire
+#   (réutilisé tant que le CSV, le tokenizer et max_length ne changent pas) ;
+# - les batchs regroupent des textes de longueurs voisines et ne sont paddés qu'au plus long d'entre eux ;
+# - accumulation de gradient, checkpoints réguliers et reprise exacte (même ordre des batchs) ;
+# - débit en tokens/s (tokens réels, hors padding) rapporté à chaque époque.
+# Mêmes hyperparamètres par défaut que le notebook (lr 2e-5, 10 époques, batch 16, max_len 256,
+# split stratifié 80/20 random_state=42) et même ordre des labels (labels.CLASS_LABELS).
+
+# --- Standard Libraries ---
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import time
+
+# --- Third-Party Libraries ---
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from sklearn.model_selection import train_test_split
+from torch.utils.data import DataLoader, Dataset, Sampler
+from transformers import BertForSequenceClassification, BertTokenizerFast, get_linear_schedule_with_warmup
+
+# --- Local Application Imports ---
+from labels import CLASS_LABELS, NUM_LABELS
+
+TOKENIZE_CHUNK = 10000     # Textes par appel au tokenizer rapide
+MEGA_BATCH_FACTOR = 50     # Batchs par groupe trié par longueur (compromis aléa / padding)
+CHECKPOINT_NAME = "last.pt"
+
+
+# --- Données ---
+def load_labeled_texts(csv_path: str, preprocess: bool = False, limit: int = 0) -> tuple[list[str], np.ndarray]:
+    """
+    Lit statement/status, ignore les lignes vides ou de label inconnu. Les labels sont
+    indexés comme CLASS_LABELS (l'ordre du LabelEncoder du notebook, comparé sans casse).
+    """
+    data = pd.read_csv(csv_path, usecols=["statement", "status"], nrows=limit or None).dropna()
+    canonical = {label.lower(): i for i, label in enumerate(CLASS_LABELS)}
+    data["label"] = data["status"].astype(str).str.strip().str.lower().map(canonical)
+    data = data.dropna(subset=["label"])
+    texts = data["statement"].astype(str)
+    if preprocess:
+        from preprocessing import preprocess_series
+        texts = preprocess_series(texts)
+    return texts.tolist(), data["label"].astype(np.int64).to_numpy()
+
+
+def cache_key(csv_path: str, tokenizer, max_length: int, preprocess: bool, limit: int) -> str:
+    stat = os.stat(csv_path)
+    vocab = json.dumps(sorted(tokenizer.get_vocab().items()))
+    payload = f"{os.path.abspath(csv_path)}|{stat.st_size}|{stat.st_mtime_ns}|{max_length}|{preprocess}|{limit}|{vocab}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def pretokenize(csv_path: str, tokenizer, max_length: int, cache_dir: str,
+                preprocess: bool = False, limit: int = 0) -> dict:
+    """
+    Tokenise le corpus une seule fois et l'enregistre en trois tableaux :
+    tokens (int32, tous les textes bout à bout), offsets (N+1) et labels (N).
+    Les appels suivants relisent le cache en mmap, sans retokeniser.
+    """
+    directory = os.path.join(cache_dir, cache_key(csv_path, tokenizer, max_length, preprocess, limit))
+    paths = {name: os.path.join(directory, f"{name}.npy") for name in ("tokens", "offsets", "labels")}
+    if not all(os.path.exists(path) for path in paths.values()):
+        print(f"🔤 Tokenisation du corpus {csv_path} (une seule fois, cache: {directory})...")
+        start_time = time.perf_counter()
+        texts, labels = load_labeled_texts(csv_path, preprocess, limit)
+        chunks, lengths = [], []
+        for start in range(0, len(texts), TOKENIZE_CHUNK):
+            encodings = tokenizer(texts[start:start + TOKENIZE_CHUNK], truncation=True, max_length=max_length)
+            for ids in encodings["input_ids"]:
+                chunks.append(np.asarray(ids, dtype=np.int32))
+                lengths.append(len(ids))
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"tokens": np.concatenate(chunks) if chunks else np.zeros(0, np.int32), "offsets": offsets, "labels": labels}
+        for name, array in arrays.items():
+            tmp_path = paths[name] + ".tmp.npy"
+            np.save(tmp_path, array)
+            os.replace(tmp_path, paths[name]) # Un fichier du cache n'existe que s'il est complet
+        print(f"   ✅ {len(labels)} textes, {offsets[-1]} tokens en {time.perf_counter() - start_time:.1f} s.")
+    return {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+
+
+class TokenizedDataset(Dataset):
+    """Vue sur le cache de tokens : l'item i est (input_ids, label), sans padding."""
+
+    def __init__(self, cache: dict, indices: np.ndarray):
+        self.tokens = cache["tokens"]
+        self.offsets = cache["offsets"]
+        self.labels = cache["labels"]
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def length(self, i: int) -> int:
+        row = self.indices[i]
+        return int(self.offsets[row + 1] - self.offsets[row])
+
+    def __getitem__(self, i: int):
+        row = self.indices[i]
+        return self.tokens[self.offsets[row]:self.offsets[row + 1]], int(self.labels[row])
+
+
+class LengthGroupedSampler(Sampler):
+    """
+    Batchs de textes de longueurs voisines : mélange, découpe en groupes de
+    `batch_size * MEGA_BATCH_FACTOR`, tri par longueur dans chaque groupe, puis mélange
+    de l'ordre des batchs. L'ordre ne dépend que de (seed, époque) : la reprise le rejoue.
+    """
+
+    def __init__(self, lengths: list[int], batch_size: int, seed: int, shuffle: bool = True):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.seed = seed
+        self.shuffle = shuffle
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def batches(self) -> list[list[int]]:
+        indices = list(range(len(self.lengths)))
+        if not self.shuffle: # Évaluation : tri global, padding minimal
+            indices.sort(key=lambda i: self.lengths[i])
+            return [indices[i:i + self.batch_size] for i in range(0, len(indices), self.batch_size)]
+
+        rng = random.Random(self.seed + self.epoch)
+        rng.shuffle(indices)
+        group_size = self.batch_size * MEGA_BATCH_FACTOR
+        batches = []
+        for start in range(0, len(indices), group_size):
+            group = sorted(indices[start:start + group_size], key=lambda i: self.lengths[i], reverse=True)
+            batches.extend(group[i:i + self.batch_size] for i in range(0, len(group), self.batch_size))
+        rng.shuffle(batches)
+        return batches
+
+    def __iter__(self):
+        return iter(self.batches())
+
+    def __len__(self):
+        return math.ceil(len(self.lengths) / self.batch_size)
+
+
+def collate(items: list, pad_token_id: int) -> dict:
+    """Padding dynamique : chaque batch est paddé à la longueur de son plus long texte."""
+    width = max(len(ids) for ids, _ in items)
+    input_ids = torch.full((len(items), width), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(items), width), dtype=torch.long)
+    for row, (ids, _) in enumerate(items):
+        input_ids[row, :len(ids)] = torch.from_numpy(np.asarray(ids, dtype=np.int64))
+        attention_mask[row, :len(ids)] = 1
+    labels = torch.tensor([label for _, label in items], dtype=torch.long)
+    return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+class _SkipBatches(Sampler):
+    """Saute les `skip` premiers batchs d'un sampler (reprise en cours d'époque)."""
+
+    def __init__(self, sampler: LengthGroupedSampler, skip: int):
+        self.sampler = sampler
+        self.skip = skip
+
+    def __iter__(self):
+        return iter(self.sampler.batches()[self.skip:])
+
+    def __len__(self):
+        return max(0, len(self.sampler) - self.skip)
+
+
+# --- Modèle ---
+def build_model_and_tokenizer(tiny: bool, seed: int):
+    if tiny:
+        from tiny_bert import tiny_model, tiny_tokenizer # Petit BERT local, sans accès au hub
+        tokenizer = tiny_tokenizer()
+        return tiny_model(len(tokenizer), seed=seed).train(), tokenizer
+    tokenizer = BertTokenizerFast.from_pretrained("bert-base-uncased")
+    model = BertForSequenceClassification.from_pretrained("bert-base-uncased", num_labels=NUM_LABELS)
+    return model, tokenizer
+
+
+# --- Checkpoints ---
+def save_checkpoint(path: str, state: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path) # Jamais de checkpoint à moitié écrit
+
+
+def evaluate(model, loader, loss_fn, device) -> dict:
+    model.eval()
+    losses, correct, total = [], 0, 0
+    with torch.no_grad():
+        for batch in loader:
+            batch = {key: value.to(device) for key, value in batch.items()}
+            logits = model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"]).logits
+            losses.append(loss_fn(logits, batch["labels"]).item())
+            correct += (logits.argmax(dim=1) == batch["labels"]).sum().item()
+            total += len(batch["labels"])
+    model.train()
+    return {"loss": float(np.mean(losses)) if losses else 0.0, "accuracy": correct / total if total else 0.0}
+
+
+def train(args):
+    torch.manual_seed(args.seed)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    device = torch.device("cuda" if torch.cuda.is_available() and not args.cpu else "cpu")
+
+    model, tokenizer = build_model_and_tokenizer(args.tiny, args.seed)
+    cache = pretokenize(args.csv_path, tokenizer, args.max_length, args.cache_dir, args.preprocess, args.limit)
+    labels = np.asarray(cache["labels"])
+    rows = np.arange(len(labels))
+    train_rows, test_rows = train_test_split(
+        rows, test_size=args.test_size, random_state=42, stratify=labels # Même split que le notebook
+    )
+    train_set = TokenizedDataset(cache, train_rows)
+    test_set = TokenizedDataset(cache, test_rows)
+    train_sampler = LengthGroupedSampler([train_set.length(i) for i in range(len(train_set))], args.batch_size, args.seed)
+    test_sampler = LengthGroupedSampler([test_set.length(i) for i in range(len(test_set))], args.batch_size, args.seed, shuffle=False)
+    collate_fn = lambda items: collate(items, tokenizer.pad_token_id)
+    test_loader = DataLoader(test_set, batch_sampler=test_sampler, collate_fn=collate_fn)
+
+    model.to(device)
+    model.train()
+    steps_per_epoch = math.ceil(len(train_sampler) / args.grad_accum)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr)
+    scheduler = get_linear_schedule_with_warmup(
+        optimizer, num_warmup_steps=args.warmup_steps, num_training_steps=steps_per_epoch * args.epochs
+    )
+    loss_fn = nn.CrossEntropyLoss()
+
+    checkpoint_path = os.path.join(args.checkpoint_dir, CHECKPOINT_NAME)
+    start_epoch, batches_done, global_step, history = 0, 0, 0, []
+    if args.resume and os.path.exists(checkpoint_path):
+        state = torch.load(checkpoint_path, map_location=device)
+        model.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        scheduler.load_state_dict(state["scheduler"])
+        start_epoch, batches_done = state["epoch"], state["batches_done"]
+        global_step, history = state["global_step"], state["history"]
+        # Mêmes masques de dropout qu'un entraînement sans interruption (map_location a pu les mettre sur GPU)
+        torch.set_rng_state(state["torch_rng"].cpu())
+        if torch.cuda.is_available() and state.get("cuda_rng"):
+            torch.cuda.set_rng_state_all([rng.cpu() for rng in state["cuda_rng"]])
+        print(f"♻️ Reprise depuis {checkpoint_path}: époque {start_epoch + 1}, {batches_done} batchs déjà faits.")
+
+    def checkpoint(epoch: int, done: int):
+        save_checkpoint(checkpoint_path, {
+            "model": model.state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "scheduler": scheduler.state_dict(),
+            "epoch": epoch,
+            "batches_done": done,
+            "global_step": global_step,
+            "history": history,
+            "torch_rng": torch.get_rng_state(),
+            "cuda_rng": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else [],
+        })
+
+    print(f"🚀 Entraînement: {len(train_set)} textes, {len(train_sampler)} batchs/époque, "
+          f"batch effectif {args.batch_size * args.grad_accum}, device {device}.")
+    for epoch in range(start_epoch, args.epochs):
+        train_sampler.set_epoch(epoch)
+        skip = batches_done if epoch == start_epoch else 0
+        loader = DataLoader(train_set, batch_sampler=_SkipBatches(train_sampler, skip), collate_fn=collate_fn)
+        total_batches = len(train_sampler)
+
+        losses, correct, seen, real_tokens, padded_tokens = [], 0, 0, 0, 0
+        start_time = time.perf_counter()
+        optimizer.zero_grad()
+        for batch_index, batch in enumerate(loader, start=skip):
+            batch = {key: value.to(device) for key, value in batch.items()}
+            group_start = batch_index - batch_index % args.grad_accum
+            group_size = min(args.grad_accum, total_batches - group_start) # Dernier groupe éventuellement incomplet
+
+            logits = model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"]).logits
+            loss = loss_fn(logits, batch["labels"])
+            (loss / group_size).backward()
+
+            losses.append(loss.item())
+            correct += (logits.argmax(dim=1) == batch["labels"]).sum().item()
+            seen += len(batch["labels"])
+            real_tokens += int(batch["attention_mask"].sum())
+            padded_tokens += batch["input_ids"].numel()
+
+            if batch_index + 1 == group_start + group_size:
+                nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+                optimizer.step()
+                scheduler.step()
+                optimizer.zero_grad()
+                global_step += 1
+                if args.checkpoint_every and global_step % args.checkpoint_every == 0:
+                    checkpoint(epoch, batch_index + 1)
+
+        elapsed = time.perf_counter() - start_time
+        evaluation = evaluate(model, test_loader, loss_fn, device)
+        record = {
+            "epoch": epoch + 1,
+            "train_loss": float(np.mean(losses)) if losses else None,
+            "train_accuracy": correct / seen if seen else None,
+            "test_loss": evaluation["loss"],
+            "test_accuracy": evaluation["accuracy"],
+            "elapsed_s": round(elapsed, 2),
+            "tokens_per_s": round(real_tokens / elapsed, 1) if elapsed > 0 else None,
+            "padding_efficiency": round(real_tokens / padded_tokens, 3) if padded_tokens else None,
+        }
+        history.append(record)
+        print(f"📈 Époque {epoch + 1}/{args.epochs}: loss {record['train_loss']:.4f}, "
+              f"test acc {record['test_accuracy']:.4f}, {record['tokens_per_s']} tokens/s, "
+              f"padding utile {record['padding_efficiency']:.0%}")
+        checkpoint(epoch + 1, 0)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    torch.save(model.state_dict(), args.output) # Même format que le notebook : chargé par main.py (MODEL_PATH)
+    report_path = os.path.splitext(args.output)[0] + ".training.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"args": vars(args), "history": history}, f, ensure_ascii=False, indent=2)
+    print(f"✅ Modèle enregistré dans {args.output} (rapport: {report_path}).")
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tuning BERT sur un CSV statement,status.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--output", default=os.getenv("MODEL_PATH", "model/bert_mental_health_model.bin"))
+    parser.add_argument("--cache-dir", default=".token_cache", help="Cache des tokens pré-calculés")
+    parser.add_argument("--checkpoint-dir", default="checkpoints")
+    parser.add_argument("--checkpoint-every", type=int, default=500, help="Pas d'optimisation entre deux checkpoints (0 = fin d'époque)")
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--grad-accum", type=int, default=1, help="Batchs accumulés par pas d'optimisation")
+    parser.add_argument("--lr", type=float, default=2e-5)
+    parser.add_argument("--warmup-steps", type=int, default=0)
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--limit", type=int, default=0, help="Ne lire que les N premières lignes (0 = tout)")
+    parser.add_argument("--preprocess", action="store_true", help="CSV brut : appliquer preprocessing.py avant tokenisation")
+    parser.add_argument("--tiny", action="store_true", help="Petit BERT aléatoire et tokenizer local (tests CPU)")
+    parser.add_argument("--cpu", action="store_true", help="Forcer le CPU même si CUDA est disponible")
+    parser.add_argument("--threads", type=int, default=0, help="torch.set_num_threads (0 = défaut)")
+    args = parser.parse_args()
+    args.grad_accum = max(1, args.grad_accum)
+    train(args)
+
+
+if __name__ == "__main__":
+    main()
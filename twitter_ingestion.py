@@ -0,0 +1,298 @@
+# twitter_ingestion.py - Ingestion incrémentale des timelines Twitter (cache username->id, since_id, pagination)
+
+# --- Standard Libraries ---
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# --- Third-Party Libraries ---
+import tweepy
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+
+# --- Local Application Imports ---
+import database
+from labels import CLASS_LABELS, FULL_MODEL
+from metrics import TWITTER_FETCH_SECONDS, timed
+
+# --- Configuration ---
+USERS_COLLECTION = os.getenv("TWITTER_USERS_COLLECTION", "twitter_users")              # username -> user_id
+TIMELINES_COLLECTION = os.getenv("TWITTER_TIMELINES_COLLECTION", "twitter_timelines")  # état par utilisateur
+TWEETS_COLLECTION = os.getenv("TWITTER_TWEETS_COLLECTION", "tweets")                   # tweets + prédictions
+USER_ID_TTL_S = int(os.getenv("TWITTER_USER_ID_TTL_S", str(24 * 3600)))                 # Durée de validité username -> id
+MAX_TWEETS_PER_USER = int(os.getenv("TWITTER_MAX_TWEETS_PER_USER", "1000"))             # Plafond d'une analyse
+PAGE_SIZE = 100                                                                         # Maximum de l'API par page
+TWEET_FIELDS = ["created_at", "public_metrics"]
+
+# Index créés au démarrage (database.ensure_indexes) : les ids de tweets sont chronologiques,
+# la lecture d'une timeline (user_id, _id décroissant) est donc aussi triée par date
+INDEXES = {
+    TWEETS_COLLECTION: [
+        IndexModel([("user_id", ASCENDING), ("_id", DESCENDING)], name="user_timeline"),
+    ],
+}
+
+logger = logging.getLogger(__name__)
+
+
+def twitter_http_error(e: Exception, username: str) -> HTTPException:
+    """Traduit une erreur tweepy (ou inattendue) en HTTPException pour l'API."""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, tweepy.errors.NotFound):
+        logger.warning("Utilisateur Twitter non trouvé (Tweepy NotFound)", extra={"username": username})
+        return HTTPException(status_code=404, detail=f"L'utilisateur Twitter @{username} n'a pas été trouvé.")
+    if isinstance(e, tweepy.errors.TweepyException):
+        logger.error("Erreur API Twitter: %s", e, extra={"username": username})
+        error_detail = f"Erreur de l'API Twitter: {e}"
+        try:
+            if hasattr(e, 'api_codes') and e.api_codes and hasattr(e, 'api_errors') and e.api_errors:
+                error_detail = f"Erreur API Twitter {e.api_codes[0]}: {e.api_errors[0]}"
+        except Exception:
+            pass
+        return HTTPException(status_code=503, detail=error_detail)
+    logger.error("Erreur inattendue lors de la récupération des tweets", exc_info=e, extra={"username": username})
+    return HTTPException(status_code=500, detail="Erreur interne inattendue lors de la récupération des tweets.")
+
+
+class TwitterIngestion:
+    """
+    Couche d'ingestion entre l'API et Twitter :
+    - met en cache username -> user_id (mémoire + MongoDB) : plus de get_user à chaque analyse
+    - stocke les tweets récupérés et leurs prédictions dans MongoDB
+    - ne demande que les tweets plus récents que le dernier stocké (since_id)
+    - pagine au-delà de 100 tweets (pagination_token), et complète vers le passé (until_id)
+    - fusionne les récupérations concurrentes d'un même utilisateur en un seul appel en vol
+    """
+
+    def __init__(self, client_getter, io_executor):
+        self._client_getter = client_getter     # Retourne le tweepy.Client courant (initialisé dans le lifespan)
+        self._io_executor = io_executor         # Pool borné pour les appels bloquants (execution.IOExecutor)
+        self._user_ids: dict[str, tuple[int, datetime]] = {}
+        self._in_flight: dict[str, tuple[asyncio.Task, int]] = {}
+
+    # --- Collections ---
+    @staticmethod
+    def _db():
+        return database.get_db()
+
+    # --- username -> user_id ---
+    def resolve_user_id(self, username: str) -> int:
+        key = username.lower()
+        now = datetime.now(timezone.utc)
+        cached = self._user_ids.get(key)
+        if cached and now - cached[1] < timedelta(seconds=USER_ID_TTL_S):
+            return cached[0]
+
+        users = self._db()[USERS_COLLECTION]
+        doc = users.find_one({"_id": key})
+        if doc and now - doc["resolved_at"].replace(tzinfo=timezone.utc) < timedelta(seconds=USER_ID_TTL_S):
+            self._user_ids[key] = (doc["user_id"], doc["resolved_at"].replace(tzinfo=timezone.utc))
+            return doc["user_id"]
+
+        logger.info("Obtention de l'ID utilisateur", extra={"username": username})
+        with timed(TWITTER_FETCH_SECONDS.labels("get_user")):
+            user_response = self._client_getter().get_user(username=username)
+        if not user_response.data:
+            logger.warning("Utilisateur Twitter non trouvé", extra={"username": username})
+            raise HTTPException(status_code=404, detail=f"L'utilisateur Twitter @{username} n'a pas été trouvé.")
+        user_id = user_response.data.id
+        users.update_one({"_id": key}, {"$set": {"user_id": user_id, "resolved_at": now}}, upsert=True)
+        self._user_ids[key] = (user_id, now)
+        return user_id
+
+    # --- Récupération paginée ---
+    def _fetch_pages(self, user_id: int, limit: int, since_id=None, until_id=None) -> tuple[list, bool]:
+        """
+        Récupère au moins `limit` tweets (si disponibles), page par page. Retourne (tweets, épuisé) où
+        `épuisé` indique que Twitter n'a plus de page à fournir dans cette direction.
+        Une page peut dépasser `limit` (minimum de 5 par page de l'API) : tout ce qui est reçu est
+        renvoyé, pour qu'aucun tweet ne manque entre les bornes du segment stocké.
+        """
+        tweets = []
+        pagination_token = None
+        while len(tweets) < limit:
+            params = {
+                "id": user_id,
+                "max_results": max(5, min(PAGE_SIZE, limit - len(tweets))), # Limites de l'API: 5..100
+                "tweet_fields": TWEET_FIELDS,
+            }
+            if since_id:
+                params["since_id"] = since_id
+            if until_id:
+                params["until_id"] = until_id
+            if pagination_token:
+                params["pagination_token"] = pagination_token
+
+            with timed(TWITTER_FETCH_SECONDS.labels("get_users_tweets")):
+                response = self._client_getter().get_users_tweets(**params)
+            tweets.extend(response.data or [])
+            pagination_token = (getattr(response, "meta", None) or {}).get("next_token")
+            if not response.data or not pagination_token:
+                return tweets, True
+        return tweets, False
+
+    @staticmethod
+    def _tweet_document(tweet, user_id: int) -> dict:
+        metrics = tweet.public_metrics or {}
+        return {
+            "_id": int(tweet.id),
+            "user_id": user_id,
+            "text": tweet.text,
+            "created_at": str(tweet.created_at), # Convertir en string pour JSON
+            "likes": metrics.get("like_count", 0),
+            "retweets": metrics.get("retweet_count", 0),
+        }
+
+    def refresh_timeline(self, username: str, want: int) -> int:
+        """
+        Met à jour la timeline stockée (appel bloquant, exécuté dans le pool Twitter) :
+        tweets plus récents que le dernier stocké, puis complément vers le passé si moins
+        de `want` tweets sont stockés. Retourne le user_id.
+
+        L'état (newest_id, oldest_id, count) décrit un segment contigu de la timeline. Si plus de
+        MAX_TWEETS_PER_USER tweets sont arrivés depuis le dernier rafraîchissement, le delta est
+        tronqué et un trou sépare son plus ancien tweet de l'ancien newest_id : le segment contigu
+        repart alors du delta, et le complément vers le passé (until_id) traverse le trou.
+        """
+        db = self._db()
+        user_id = self.resolve_user_id(username)
+        state = db[TIMELINES_COLLECTION].find_one({"_id": user_id}) or {}
+
+        new_tweets = []
+        count = state.get("count", 0)
+        oldest_id = state.get("oldest_id")
+        exhausted = state.get("exhausted", False)
+        if state.get("newest_id"):
+            new_tweets, caught_up = self._fetch_pages(user_id, MAX_TWEETS_PER_USER, since_id=state["newest_id"])
+            if not caught_up:
+                # Delta tronqué : les tweets stockés ne prolongent plus les nouveaux sans trou
+                logger.warning("Delta de timeline tronqué, segment contigu réinitialisé", extra={
+                    "username": username, "new_tweets": len(new_tweets)
+                })
+                count, oldest_id, exhausted = 0, None, False
+        else:
+            new_tweets, exhausted = self._fetch_pages(user_id, want)
+        if new_tweets and oldest_id is None:
+            oldest_id = min(int(tweet.id) for tweet in new_tweets)
+
+        stored = count + len(new_tweets)
+        older_tweets = []
+        if stored < want and not exhausted and oldest_id:
+            older_tweets, exhausted = self._fetch_pages(user_id, want - stored, until_id=oldest_id)
+
+        fetched = new_tweets + older_tweets
+        if fetched:
+            # $set sans le champ prediction : les tweets déjà stockés (trou re-traversé) gardent leur prédiction
+            db[TWEETS_COLLECTION].bulk_write(
+                [UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True)
+                 for doc in (self._tweet_document(tweet, user_id) for tweet in fetched)],
+                ordered=False
+            )
+        newest_ids = [int(tweet.id) for tweet in new_tweets] + ([state["newest_id"]] if state.get("newest_id") else [])
+        newest = max(newest_ids) if newest_ids else None
+        if older_tweets:
+            oldest_id = min(oldest_id, *(int(tweet.id) for tweet in older_tweets))
+        db[TIMELINES_COLLECTION].update_one(
+            {"_id": user_id},
+            {"$set": {
+                "username": username.lower(),
+                "newest_id": newest,
+                "oldest_id": oldest_id,
+                "count": stored + len(older_tweets),
+                "exhausted": exhausted,
+                "refreshed_at": datetime.now(timezone.utc),
+            }},
+            upsert=True
+        )
+        logger.info("Timeline mise à jour", extra={
+            "username": username, "new_tweets": len(new_tweets), "older_tweets": len(older_tweets)
+        })
+        return user_id
+
+    def read_timeline(self, user_id: int, max_tweets: int, model_fingerprint: str | None = None) -> list[dict]:
+        """
+        Lit les `max_tweets` tweets stockés les plus récents. Une prédiction stockée n'est
+        renvoyée que si elle provient du modèle courant (`model_fingerprint`).
+        """
+        cursor = self._db()[TWEETS_COLLECTION].find({"user_id": user_id}).sort("_id", DESCENDING).limit(max_tweets)
+        tweets = []
+        for doc in cursor:
+            prediction = doc.get("prediction")
+            tweets.append({
+                "id": doc["_id"],
+                "text": doc["text"],
+                "created_at": doc["created_at"],
+                "likes": doc["likes"],
+                "retweets": doc["retweets"],
+                "prediction": (
+                    (prediction["label"], prediction["probabilities"], prediction.get("answered_by", FULL_MODEL))
+                    if prediction and prediction.get("model") == model_fingerprint else None
+                ),
+            })
+        return tweets
+
+    def store_predictions(self, tweet_ids: list[int], predictions: list, model_fingerprint: str) -> set[int]:
+        """
+        Enregistre les prédictions valides à côté des tweets. Retourne les ids effectivement
+        écrits par cet appel : un tweet déjà scoré par ce modèle (ex. par une analyse concurrente)
+        n'est pas réécrit, ce qui permet d'alimenter les agrégats sans double comptage.
+        """
+        write_id = uuid.uuid4().hex # Marque les documents écrits par cet appel
+        operations = [
+            UpdateOne(
+                {"_id": tweet_id, "prediction.model": {"$ne": model_fingerprint}},
+                {"$set": {"prediction": {
+                    "label": label,
+                    "probabilities": probabilities,
+                    "answered_by": answered_by,
+                    "model": model_fingerprint,
+                    "write_id": write_id,
+                }}}
+            )
+            for tweet_id, (label, probabilities, answered_by) in zip(tweet_ids, predictions)
+            if label in CLASS_LABELS # Pas de stockage pour "Invalid Input" / "Prediction Error"
+        ]
+        if not operations:
+            return set()
+        tweets = self._db()[TWEETS_COLLECTION]
+        tweets.bulk_write(operations, ordered=False)
+        written = tweets.find({"_id": {"$in": tweet_ids}, "prediction.write_id": write_id}, {"_id": 1})
+        return {doc["_id"] for doc in written}
+
+    # --- API asynchrone ---
+    async def get_tweets(self, username: str, max_tweets: int, model_fingerprint: str | None = None) -> list[dict]:
+        """
+        Retourne les `max_tweets` tweets les plus récents de l'utilisateur, après une mise à jour
+        incrémentale. Les appels concurrents pour un même utilisateur partagent la même mise à jour.
+        """
+        key = username.lower()
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            task, target = in_flight
+            user_id = await asyncio.shield(task)
+            if max_tweets > target: # La mise à jour partagée visait moins de tweets : compléter
+                user_id = await self._refresh(key, username, max_tweets)
+        else:
+            user_id = await self._refresh(key, username, max_tweets)
+
+        return await asyncio.to_thread(self.read_timeline, user_id, max_tweets, model_fingerprint)
+
+    async def _refresh(self, key: str, username: str, want: int) -> int:
+        async def run():
+            try:
+                return await self._io_executor.run(self.refresh_timeline, username, want)
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise twitter_http_error(e, username)
+
+        task = asyncio.ensure_future(run())
+        self._in_flight[key] = (task, want)
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._in_flight.get(key, (None,))[0] is task:
+                del self._in_flight[key]